@@ -0,0 +1,52 @@
+import { useEffect, useState } from "react";
+
+export interface AttackRate {
+    resolution: number;
+    range: number;
+    start: number;
+    counts: number[];
+    total: number;
+}
+
+// resolution/range are durations understood by the log service: "60", "5m", "24h", "7d"
+export function useAttackRate(resolution = "minute", range = "1h") {
+    const [rate, setRate] = useState<AttackRate>({
+        resolution: 60,
+        range: 3600,
+        start: 0,
+        counts: [],
+        total: 0
+    });
+
+    useEffect(() => {
+        const fetchRate = async () => {
+            try {
+                const query = `resolution=${encodeURIComponent(resolution)}&range=${encodeURIComponent(range)}`;
+                const apiUrl = import.meta.env.DEV
+                    ? `/api/v1/ext/logs/attack-rate?${query}`
+                    : `${import.meta.env.VITE_GATEWAY_URL || "http://localhost:3002"}/api/v1/ext/logs/attack-rate?${query}`;
+
+                const response = await fetch(apiUrl, {
+                    headers: { Accept: "application/json" },
+                });
+
+                if (response.ok) {
+                    const data = await response.json();
+                    setRate(data);
+                }
+            } catch (err) {
+                console.error("Failed to fetch attack rate:", err);
+            }
+        };
+
+        // Initial fetch
+        fetchRate();
+
+        // Poll every 2 seconds for updates
+        const interval = setInterval(fetchRate, 2000);
+
+        return () => clearInterval(interval);
+    }, [resolution, range]);
+
+    return rate;
+}
@@ -2,17 +2,17 @@ import { useEffect, useState } from "react";
 
 export interface PersistentStats {
     total_attacks: number;
-    unique_ips: string[];
-    unique_countries: string[];
-    timestamps: string[];
+    unique_ip_count: number;
+    unique_ip_count_exact: boolean;
+    unique_country_count: number;
 }
 
 export function usePersistentStats() {
     const [stats, setStats] = useState<PersistentStats>({
         total_attacks: 0,
-        unique_ips: [],
-        unique_countries: [],
-        timestamps: []
+        unique_ip_count: 0,
+        unique_ip_count_exact: true,
+        unique_country_count: 0
     });
 
     useEffect(() => {
@@ -1,34 +1,18 @@
 import { BentoCard, BentoGrid } from "@/components/ui/bento-grid";
 import { Activity, Network, Globe, Gauge } from "lucide-react";
 import { usePersistentStats } from "@/lib/usePersistentStats";
+import { useAttackRate } from "@/lib/useAttackRate";
 
 export default function AttackOverview() {
   const stats = usePersistentStats();
+  const rate = useAttackRate("minute", "1h");
 
   const totalAttacks = stats.total_attacks;
-  const uniqueIPs = stats.unique_ips.length;
-  const totalCountries = stats.unique_countries.length;
+  const uniqueIPs = stats.unique_ip_count;
+  const totalCountries = stats.unique_country_count;
 
-  // Calculate attack rate
-  let attackRate = 0;
-  if (stats.timestamps.length > 1) {
-    const timestamps = stats.timestamps
-      .map(t => new Date(t).getTime())
-      .filter(t => !isNaN(t))
-      .sort((a, b) => a - b);
-    
-    if (timestamps.length > 1) {
-      const timeStart = timestamps[0];
-      const timeEnd = timestamps[timestamps.length - 1];
-      const hoursDiff = (timeEnd - timeStart) / (1000 * 60 * 60);
-
-      if (hoursDiff > 0.0002) {
-        attackRate = totalAttacks / hoursDiff;
-      } else {
-        attackRate = totalAttacks * 3600;
-      }
-    }
-  }
+  // Attacks over the last hour, from the log service's per-minute counters
+  const attackRate = rate.total;
 
   const features = [
     {
@@ -53,11 +37,11 @@ export default function AttackOverview() {
       cta: "Geographic spread of hostile actors",
     },
     {
-      name: `${attackRate.toFixed(2)}/hr`,
+      name: `${attackRate}/hr`,
       className: "col-span-1 md:col-span-1 lg:col-span-2",
       Icon: Gauge,
       description: "Attack Rate",
-      cta: "Average attacks occurring each hour",
+      cta: "Attacks over the last hour",
     },
   ];
 
@@ -12,6 +12,10 @@ let recentLogs = [];
 dotenv.config();
 const GatewayPORT = process.env.Gateway_PORT || 3002;
 
+// "stateful": ML service keeps its own per-IP window, we only send current_log
+// "stateless": resend the full last-minute window with every event (backfills)
+const MLMode = process.env.ML_MODE || "stateful";
+
 // Helper function to clean up old logs
 function pruneOldLogs() {
   const oneMinuteAgo = Date.now() - 60 * 1000;
@@ -30,17 +34,17 @@ await consumer.run({
   eachMessage: async ({ message }) => {
     const log = JSON.parse(message.value.toString());
 
-    // Prune old logs before pushing new one
-    pruneOldLogs();
+    // Prepare payload for ML service
+    const payload = { current_log: log };
 
-    // Add the current log to recent logs buffer
-    recentLogs.push(log);
+    if (MLMode === "stateless") {
+      // Prune old logs before pushing new one
+      pruneOldLogs();
 
-    // Prepare payload for ML service
-    const payload = {
-      current_log: log,
-      recent_logs: recentLogs,
-    };
+      // Add the current log to recent logs buffer
+      recentLogs.push(log);
+      payload.recent_logs = recentLogs;
+    }
 
     // console.log("");
     // console.log("----------------------------------------------------------------");
@@ -10,10 +10,12 @@ router.get("/logs/recent-logs", async (req, res) => {
   try {
 
     const response = await axios.get(`http://localhost:8001/recent-logs`, {
-      headers: { Accept: "application/json" }
+      params: req.query,
+      headers: { Accept: "application/json" },
+      validateStatus: (status) => status < 500
     });
 
-    res.status(200).json(response.data);
+    res.status(response.status).json(response.data);
   } catch (err) {
     console.error("Error fetching recent logs:", err.message);
     res.status(500).json({ error: "Failed to fetch recent logs" });
@@ -33,6 +35,21 @@ router.get("/logs/persistent-stats", async (req, res) => {
   }
 });
 
+router.get("/logs/attack-rate", async (req, res) => {
+  try {
+    const response = await axios.get(`http://localhost:8001/attack-rate`, {
+      params: req.query,
+      headers: { Accept: "application/json" },
+      validateStatus: (status) => status < 500
+    });
+
+    res.status(response.status).json(response.data);
+  } catch (err) {
+    console.error("Error fetching attack rate:", err.message);
+    res.status(500).json({ error: "Failed to fetch attack rate" });
+  }
+});
+
 router.get("/malicious-urls", async (req, res) => {
   try {
     const response = await axios.get(`https://urlhaus.abuse.ch/downloads/json_recent/`, {
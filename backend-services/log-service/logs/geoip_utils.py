@@ -1,31 +1,59 @@
 """
 GeoIP utility functions for converting IP addresses to countries.
 Uses MaxMind GeoLite2 database (offline, free).
+
+Lookups go through an LRU cache of GEOIP_CACHE_SIZE addresses (default
+65536) that keeps misses ("no country") as well as hits, since the same
+attacker IPs come back constantly. On a cache miss, private (RFC1918),
+loopback, link-local, multicast and reserved addresses resolve to None
+without touching the database. GEOIP_MODE picks how the database is opened:
+"auto" (default: the C extension if installed, else memory-mapped), "mmap",
+"memory" (read fully into RAM) or "file".
 """
-import os
 from collections import defaultdict
+from functools import lru_cache
 from typing import Dict, Optional
+import ipaddress
+import os
 
 try:
     import geoip2.database
+    import geoip2.errors
     GEOIP_AVAILABLE = True
 except ImportError:
     GEOIP_AVAILABLE = False
     print("WARNING: geoip2 library not installed. Install with: pip install geoip2")
 
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "65536"))
+GEOIP_MODE = os.getenv("GEOIP_MODE", "auto").lower()
+GEOIP_MODES = {
+    "auto": "MODE_AUTO",
+    "mmap": "MODE_MMAP",
+    "memory": "MODE_MEMORY",
+    "file": "MODE_FILE",
+}
+
 # Global reader instance (lazy loaded)
 _reader = None
 _db_path = None
+_db_mode = None
+
+# Outcomes of the lookups that missed the cache
+_lookup_counts = defaultdict(int)
+
+class _TransientLookupError(Exception):
+    """Raised through the cache so a failed read is retried, not remembered."""
 
-def init_geoip(db_path: str = None):
+def init_geoip(db_path: str = None, mode: str = None):
     """
     Initialize the GeoIP database reader.
     
     Args:
         db_path: Path to GeoLite2-Country.mmdb file.
                  If None, looks for it in common locations or uses GEOIP_DB_PATH env var.
+        mode: One of GEOIP_MODES; defaults to the GEOIP_MODE env var.
     """
-    global _reader, _db_path
+    global _reader, _db_path, _db_mode
     
     if not GEOIP_AVAILABLE:
         return False
@@ -61,15 +89,51 @@ def init_geoip(db_path: str = None):
         print(f"WARNING: GeoIP database not found at {db_path}")
         return False
     
+    mode = (mode or GEOIP_MODE).lower()
+    if mode not in GEOIP_MODES:
+        print(f"WARNING: Unknown GEOIP_MODE '{mode}', using 'auto'. Choose from: {', '.join(GEOIP_MODES)}")
+        mode = "auto"
+    
     try:
-        _reader = geoip2.database.Reader(db_path)
+        _reader = geoip2.database.Reader(db_path, mode=getattr(geoip2.database, GEOIP_MODES[mode]))
         _db_path = db_path
-        print(f"GeoIP database loaded from {db_path}")
+        _db_mode = mode
+        # Drop any "no country" answers cached before the database was open
+        _cached_lookup.cache_clear()
+        print(f"GeoIP database loaded from {db_path} (mode: {mode})")
         return True
     except Exception as e:
         print(f"ERROR: Failed to load GeoIP database: {e}")
         return False
 
+def _lookup(ip: str) -> Optional[str]:
+    """
+    Uncached lookup: the fast path for non-public addresses, then the
+    database. Only real answers and "not in the database" are returned (and
+    cached); other reader errors raise _TransientLookupError.
+    """
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        _lookup_counts["invalid"] += 1
+        return None
+    if not addr.is_global or addr.is_multicast:
+        _lookup_counts["non_public"] += 1
+        return None
+    
+    try:
+        response = _reader.country(addr)
+    except geoip2.errors.AddressNotFoundError:
+        _lookup_counts["not_found"] += 1
+        return None
+    except Exception as e:
+        _lookup_counts["errors"] += 1
+        raise _TransientLookupError(e) from e
+    _lookup_counts["database"] += 1
+    return response.country.iso_code
+
+_cached_lookup = lru_cache(maxsize=GEOIP_CACHE_SIZE)(_lookup)
+
 def ip_to_country(ip: str) -> Optional[str]:
     """
     Convert an IP address to a country ISO code.
@@ -80,18 +144,32 @@ def ip_to_country(ip: str) -> Optional[str]:
     Returns:
         Country ISO code (e.g., "IN") or None if not found/error
     """
-    global _reader
-    
-    if not GEOIP_AVAILABLE or _reader is None:
+    if not GEOIP_AVAILABLE or _reader is None or not isinstance(ip, str):
         return None
     
     try:
-        response = _reader.country(ip)
-        return response.country.iso_code
-    except Exception as e:
-        # IP not found, private IP, or other error
+        return _cached_lookup(ip)
+    except _TransientLookupError:
         return None
 
+def geoip_stats() -> dict:
+    """Cache hit/miss counters and what the misses resolved to."""
+    info = _cached_lookup.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "database": _db_path,
+        "mode": _db_mode,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "misses_by_outcome": {
+            outcome: _lookup_counts[outcome]
+            for outcome in ("database", "not_found", "non_public", "invalid", "errors")
+        },
+    }
+
 def process_logs_for_countries(logs: list) -> Dict[str, int]:
     """
     Process a list of logs and return country counts.
@@ -0,0 +1,116 @@
+"""
+Fixed-capacity ring buffer of the most recent enriched logs.
+
+Every appended log gets the next sequence number (starting at 1, stored in
+the log as "seq"), and sequence numbers keep increasing across resets. Slots
+are overwritten in place when the buffer wraps, so appends are O(1) and a
+read costs O(logs returned) whatever RECENT_LOGS_CAPACITY is.
+
+Sequence numbers start again at 1 when the service restarts, so pollers get
+a cursor "<epoch>:<seq>", where the epoch is the boot time in milliseconds.
+A cursor from another boot is read from the start of the buffer and the
+response says "restarted", rather than skipping the new boot's logs up to
+the old sequence number.
+"""
+from collections import deque
+from typing import Optional, Tuple
+import os
+import threading
+import time
+
+RECENT_LOGS_CAPACITY = int(os.getenv("RECENT_LOGS_CAPACITY", "1000"))
+MAX_CLEARED_RANGES = 64  # clear() ranges remembered, so they are not reported as missed
+
+def parse_cursor(value: str) -> Tuple[Optional[int], int]:
+    """(epoch, seq) from "<epoch>:<seq>", or (None, seq) from a bare "<seq>"."""
+    epoch, _, seq = value.rpartition(":")
+    seq = int(seq)
+    if seq < 0:
+        raise ValueError("cursor sequence number must not be negative")
+    return (int(epoch) if epoch else None), seq
+
+class RecentLogs:
+    """The last `capacity` logs, addressed by sequence number."""
+
+    def __init__(self, capacity: int = RECENT_LOGS_CAPACITY):
+        if capacity < 1:
+            raise ValueError("RECENT_LOGS_CAPACITY must be at least 1")
+        self.capacity = capacity
+        self.epoch = int(time.time() * 1000)
+        self._slots = [None] * capacity
+        self._next_seq = 1
+        self._first_seq = 1  # oldest seq still held, moved forward by clear()
+        self._cleared = deque(maxlen=MAX_CLEARED_RANGES)  # (first, last) seqs dropped by clear()
+        self._lock = threading.Lock()
+
+    def append(self, log: dict) -> int:
+        """Store `log`, tagging it with its sequence number, and return it."""
+        with self._lock:
+            seq = self._next_seq
+            log["seq"] = seq
+            self._slots[seq % self.capacity] = log
+            self._next_seq = seq + 1
+            return seq
+
+    def _bounds(self):
+        last = self._next_seq - 1
+        return max(self._first_seq, last - self.capacity + 1), last
+
+    def _overwritten(self, since: int, first: int) -> int:
+        """How many of the seqs between `since` and `first` were overwritten, not cleared."""
+        gone = max(0, first - since - 1)
+        for low, high in self._cleared:
+            gone -= max(0, min(high, first - 1) - max(low, since + 1) + 1)
+        return gone
+
+    def read(self, limit: int, since: Optional[int] = None, epoch: Optional[int] = None) -> dict:
+        """
+        Without `since`, the newest `limit` logs. With it, the oldest `limit`
+        logs after `since`, so a poller can page forward; "missed" counts
+        the ones after `since` that were overwritten before being read.
+        Logs are oldest first either way, and "next_since" is the cursor to
+        send next; when nothing is returned it stays at `since`, so a
+        `limit` of 0 does not skip anything. A `since` from another epoch
+        (or beyond the newest log, for a cursor without one) is read from
+        the start of the buffer.
+        """
+        with self._lock:
+            first, last = self._bounds()
+            missed = 0
+            restarted = since is not None and (epoch != self.epoch if epoch is not None else since > last)
+            if restarted:
+                since = first - 1
+            if since is None:
+                start = max(first, last - limit + 1)
+                end = last
+            else:
+                start = max(first, since + 1)
+                end = min(last, start + limit - 1)
+                missed = self._overwritten(since, first)
+            slots, capacity = self._slots, self.capacity
+            logs = [slots[seq % capacity] for seq in range(start, end + 1)]
+            if logs:
+                next_since = end
+            elif since is not None:
+                next_since = min(since, last)
+            else:
+                next_since = last
+            return {
+                "logs": logs,
+                "epoch": self.epoch,
+                "first_seq": first,
+                "last_seq": last,
+                "next_since": f"{self.epoch}:{next_since}",
+                "missed": missed,
+                "restarted": restarted,
+                "held": last - first + 1,
+            }
+
+    def clear(self):
+        """Drop every log; sequence numbers carry on from where they were."""
+        with self._lock:
+            first, last = self._bounds()
+            if last >= first:
+                self._cleared.append((first, last))
+            self._slots = [None] * self.capacity
+            self._first_seq = self._next_seq
@@ -0,0 +1,471 @@
+"""
+In-memory persistent-stats aggregator with write-behind flushing.
+
+The stats live in memory and are the source of truth while the service
+runs. stats.json is read once at startup and rewritten in the background:
+after STATS_FLUSH_EVERY new events, every STATS_FLUSH_INTERVAL seconds if
+anything changed, and at exit. Each flush writes a temporary file, fsyncs
+it and renames it over stats.json, so a crash leaves the previous file
+intact. At most the last flush interval of events is lost.
+
+Unique source IPs are hash sets of the integer addresses (IPv4 and IPv6
+apart), and unique countries a set of ISO codes. On disk the IPs are sorted,
+packed big-endian (4 or 16 bytes each), zlib-compressed and base64-encoded.
+Past STATS_EXACT_IPS distinct IPs (default 1,000,000) the sets are replaced
+by a HyperLogLog sketch: 16 KB whatever the count, within about 1% of it.
+The old stats.json layout with plain lists is read and converted.
+
+The attack rate comes from ring buffers of per-second (last hour),
+per-minute (last day) and per-hour (last 30 days) counters, bucketed by
+arrival time. Recording an event bumps one counter in each ring; a slot is
+zeroed lazily when the ring wraps onto it. RateHistogram.series() reads the
+coarsest ring whose width divides the asked resolution and that still
+covers the range; any such ring gives the same counts, and the coarsest
+has the fewest slots to sum.
+
+Like the in-memory channel layer, this assumes one service process; several
+processes would each keep their own totals.
+"""
+from datetime import datetime, timezone
+from hashlib import blake2b
+import atexit
+import base64
+import ipaddress
+import json
+import math
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+
+STATS_FILE = os.getenv("STATS_FILE", os.path.join(os.path.dirname(__file__), "stats.json"))
+STATS_FLUSH_EVERY = int(os.getenv("STATS_FLUSH_EVERY", "1000"))
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))
+STATS_EXACT_IPS = int(os.getenv("STATS_EXACT_IPS", "1000000"))
+SKETCH_PRECISION = 14  # 2**14 one-byte registers, ~0.8% standard error
+
+# ========================== Unique IPs ==========================
+
+def _pack(values, size: int) -> str:
+    if size == 4:
+        data = struct.pack(f">{len(values)}I", *sorted(values))
+    else:
+        data = b"".join(v.to_bytes(size, "big") for v in sorted(values))
+    return base64.b64encode(zlib.compress(data)).decode("ascii")
+
+def _unpack(blob: str, size: int) -> set:
+    if not blob:
+        return set()
+    data = zlib.decompress(base64.b64decode(blob))
+    if size == 4:
+        return set(struct.unpack(f">{len(data) // 4}I", data))
+    return {int.from_bytes(data[i:i + size], "big") for i in range(0, len(data), size)}
+
+def _parse_ip(ip: str):
+    """(4 or 6, integer address), or None if `ip` is not an IP address string."""
+    if not isinstance(ip, str):
+        return None
+    # inet_pton is several times faster than ipaddress.ip_address
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, ValueError):
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip.split("%", 1)[0]), "big")
+    except (OSError, ValueError):
+        return None
+
+def _ip_key(addr) -> str:
+    """Canonical text of a parsed address; what the sketch hashes."""
+    version, value = addr
+    return str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision bytes."""
+
+    def __init__(self, precision: int = SKETCH_PRECISION, registers: bytes = None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("HyperLogLog registers do not match the precision")
+
+    def add(self, key: str):
+        x = int.from_bytes(blake2b(key.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big")
+        rest_bits = 64 - self.p
+        index = x >> rest_bits
+        rank = rest_bits - (x & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = self.m
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # small-range correction
+        return round(estimate)
+
+class UniqueIPs:
+    """
+    Distinct source IPs: exact sets up to `limit`, then a HyperLogLog sketch.
+    Addresses are compared as integers, so different spellings of one IPv6
+    address count once; values that are not IP addresses are kept as strings.
+    """
+
+    def __init__(self, limit: int = STATS_EXACT_IPS):
+        self.limit = limit
+        self.ipv4 = set()
+        self.ipv6 = set()
+        self.other = set()
+        self.sketch = None
+
+    def __len__(self) -> int:
+        if self.sketch is not None:
+            return self.sketch.count()
+        return len(self.ipv4) + len(self.ipv6) + len(self.other)
+
+    @property
+    def exact(self) -> bool:
+        return self.sketch is None
+
+    def add(self, ip: str):
+        addr = _parse_ip(ip)
+        if addr is None and not isinstance(ip, str):
+            ip = str(ip)  # e.g. a number or list in the log's src_ip
+        if self.sketch is not None:
+            self.sketch.add(_ip_key(addr) if addr else ip)
+            return
+        if addr is None:
+            self.other.add(ip)
+        elif addr[0] == 4:
+            self.ipv4.add(addr[1])
+        else:
+            self.ipv6.add(addr[1])
+        if len(self.ipv4) + len(self.ipv6) + len(self.other) > self.limit:
+            self._to_sketch()
+
+    def _to_sketch(self):
+        sketch = HyperLogLog()
+        for value in self.ipv4:
+            sketch.add(_ip_key((4, value)))
+        for value in self.ipv6:
+            sketch.add(_ip_key((6, value)))
+        for value in self.other:
+            sketch.add(value)
+        self.sketch = sketch
+        self.ipv4, self.ipv6, self.other = set(), set(), set()
+
+    def copy(self) -> "UniqueIPs":
+        ips = UniqueIPs(self.limit)
+        if self.sketch is not None:
+            ips.sketch = HyperLogLog(self.sketch.p, self.sketch.registers)
+        else:
+            ips.ipv4, ips.ipv6, ips.other = set(self.ipv4), set(self.ipv6), set(self.other)
+        return ips
+
+    def to_json(self) -> dict:
+        if self.sketch is not None:
+            return {
+                "sketch": base64.b64encode(zlib.compress(bytes(self.sketch.registers))).decode("ascii"),
+                "precision": self.sketch.p,
+            }
+        return {"ipv4": _pack(self.ipv4, 4), "ipv6": _pack(self.ipv6, 16), "other": sorted(self.other)}
+
+    @classmethod
+    def from_json(cls, data, limit: int = STATS_EXACT_IPS) -> "UniqueIPs":
+        ips = cls(limit)
+        if isinstance(data, list):
+            # Old layout: a plain list of IP strings
+            for ip in data:
+                ips.add(ip)
+        elif "sketch" in data:
+            ips.sketch = HyperLogLog(data["precision"], zlib.decompress(base64.b64decode(data["sketch"])))
+        else:
+            ips.ipv4 = _unpack(data.get("ipv4", ""), 4)
+            ips.ipv6 = _unpack(data.get("ipv6", ""), 16)
+            ips.other = set(data.get("other", []))
+            if len(ips) > limit:
+                ips._to_sketch()
+        return ips
+
+# ========================== Attack Rate ==========================
+
+# name -> (seconds per bucket, buckets kept)
+RATE_RINGS = {
+    "second": (1, 3600),
+    "minute": (60, 1440),
+    "hour": (3600, 720),
+}
+
+class RateRing:
+    """Event counts for the last `size` buckets of `width` seconds."""
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.counts = [0] * size
+        self.buckets = [-1] * size  # bucket number each slot currently holds
+        self.last = -1
+
+    def add(self, bucket: int, n: int = 1):
+        slot = bucket % self.size
+        held = self.buckets[slot]
+        if held != bucket:
+            if held > bucket:
+                return  # older than the ring reaches
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += n
+        if bucket > self.last:
+            self.last = bucket
+
+    def covers(self, first: int, last: int) -> bool:
+        return last - first < self.size
+
+    def counts_between(self, first: int, last: int) -> list:
+        """Counts of buckets first..last inclusive; must fit in the ring."""
+        counts, buckets, size = self.counts, self.buckets, self.size
+        return [counts[b % size] if buckets[b % size] == b else 0 for b in range(first, last + 1)]
+
+    def to_json(self) -> dict:
+        first = self.last - self.size + 1
+        return {"last": self.last, "counts": self.counts_between(first, self.last) if self.last >= 0 else []}
+
+    def load(self, data: dict):
+        last = data["last"]
+        first = last - len(data["counts"]) + 1
+        for i, n in enumerate(data["counts"]):
+            if n:
+                self.add(first + i, n)
+
+class RateHistogram:
+    """Attack counts at several resolutions, each a RateRing."""
+
+    def __init__(self):
+        self.rings = {name: RateRing(width, size) for name, (width, size) in RATE_RINGS.items()}
+
+    def add(self, when: float, n: int = 1):
+        second = int(when)
+        for ring in self.rings.values():
+            ring.add(second // ring.width, n)
+
+    def series(self, resolution: int, span: int, now: float = None) -> dict:
+        """
+        Counts per `resolution` seconds over the last `span` seconds, oldest
+        first; the last bucket is the current, partial one. Raises ValueError
+        if no ring has a width dividing `resolution` and reaches back far enough.
+        """
+        now = time.time() if now is None else now
+        points = max(1, -(-span // resolution))
+        end = int(now) // resolution
+        first = end - points + 1
+        usable = [
+            ring for ring in self.rings.values()
+            if resolution % ring.width == 0
+            and ring.covers(first * (resolution // ring.width), (end + 1) * (resolution // ring.width) - 1)
+        ]
+        if not usable:
+            raise ValueError(f"No rate history at {resolution}s resolution over {span}s")
+        ring = max(usable, key=lambda r: r.width)
+        step = resolution // ring.width
+        raw = ring.counts_between(first * step, (end + 1) * step - 1)
+        counts = [sum(raw[i:i + step]) for i in range(0, len(raw), step)] if step > 1 else raw
+        return {
+            "resolution": resolution,
+            "range": span,
+            "start": first * resolution,
+            "counts": counts,
+            "total": sum(counts),
+        }
+
+    def to_json(self) -> dict:
+        return {name: ring.to_json() for name, ring in self.rings.items()}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "RateHistogram":
+        histogram = cls()
+        for name, ring in histogram.rings.items():
+            if name in data:
+                ring.load(data[name])
+        return histogram
+
+def _timestamp_seconds(value):
+    """Epoch seconds of an ISO-8601 string or epoch-ms number, else None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value / 1000
+    if isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    return None
+
+# ========================== Aggregator ==========================
+
+def default_stats() -> dict:
+    return {
+        "total_attacks": 0,
+        "unique_ips": UniqueIPs(),
+        "unique_countries": set(),
+        "rate": RateHistogram(),
+    }
+
+def write_atomic(path: str, data: str):
+    """Replace `path` with `data` so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class StatsAggregator:
+    """Attack totals kept in memory and flushed to `path` in the background."""
+
+    def __init__(self, path: str = STATS_FILE, flush_every: int = STATS_FLUSH_EVERY,
+                 flush_interval: float = STATS_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._ips_json = (None, None)
+        self._stats = self._load()
+
+    def _load(self) -> dict:
+        """Read the stats file once; a missing, empty or corrupt file starts from zero."""
+        stats = default_stats()
+        try:
+            with open(self.path, "r") as f:
+                content = f.read().strip()
+            if content:
+                data = json.loads(content)
+                stats["total_attacks"] = data.get("total_attacks", 0)
+                stats["unique_ips"] = UniqueIPs.from_json(data.get("unique_ips", []))
+                stats["unique_countries"] = set(data.get("unique_countries", []))
+                if "rate" in data:
+                    stats["rate"] = RateHistogram.from_json(data["rate"])
+                else:
+                    # Old layout: up to 50k raw timestamps, converted once
+                    for value in data.get("timestamps", []):
+                        when = _timestamp_seconds(value)
+                        if when is not None:
+                            stats["rate"].add(when)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"WARNING: Could not read {self.path}, starting stats from zero: {e}")
+        return stats
+
+    def record(self, ip=None, country=None, now: float = None):
+        """Count one event, arriving at `now` (default: the current time)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = self._stats
+            stats["total_attacks"] += 1
+            if ip:
+                stats["unique_ips"].add(ip)
+            if country:
+                stats["unique_countries"].add(country)
+            stats["rate"].add(now)
+            self._dirty += 1
+            if self._dirty >= self.flush_every:
+                self._wake.set()
+
+    def snapshot(self) -> dict:
+        """Totals and unique counts, without the underlying sets."""
+        with self._lock:
+            stats = self._stats
+            ips = stats["unique_ips"]
+            return {
+                "total_attacks": stats["total_attacks"],
+                "unique_ip_count": len(ips),
+                "unique_ip_count_exact": ips.exact,
+                "unique_country_count": len(stats["unique_countries"]),
+            }
+
+    def attack_rate(self, resolution: int, span: int) -> dict:
+        """See RateHistogram.series."""
+        with self._lock:
+            return self._stats["rate"].series(resolution, span)
+
+    def _serialize(self) -> str:
+        # Copy under the lock, encode outside it. The exact IP sets only
+        # grow, so an unchanged size means the last encoding still holds
+        # (sorting a million IPs takes about a second).
+        with self._lock:
+            stats = self._stats
+            total = stats["total_attacks"]
+            ips = stats["unique_ips"]
+            ips_key = (len(ips.ipv4), len(ips.ipv6), len(ips.other)) if ips.exact else None
+            if ips_key is None or ips_key != self._ips_json[0]:
+                ips = ips.copy()
+            else:
+                ips = None
+            countries = sorted(stats["unique_countries"])
+            rate = stats["rate"].to_json()
+        if ips is not None:
+            self._ips_json = (ips_key, ips.to_json())
+        return json.dumps({
+            "total_attacks": total,
+            "unique_ips": self._ips_json[1],
+            "unique_countries": countries,
+            "rate": rate,
+        })
+
+    def flush(self):
+        """Write the stats to disk if anything changed since the last flush."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                dirty = self._dirty
+                self._dirty = 0
+            try:
+                write_atomic(self.path, self._serialize())
+            except OSError as e:
+                with self._lock:
+                    self._dirty += dirty
+                print(f"WARNING: Could not write {self.path}: {e}")
+                return
+
+    def _run(self):
+        # Woken early by record() once flush_every events are pending
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        """Start the periodic flush thread and flush once more at exit."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stats-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.flush()
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.utils.decorators import decorator_from_middleware
-from .views import send_log, get_country_counts, reset_country_counts, get_recent_logs, get_persistent_stats
+from .views import send_log, get_country_counts, reset_country_counts, get_recent_logs, get_persistent_stats, get_attack_rate, get_geoip_stats
 from .middleware import VerifyG2SMiddleware
 
 verify_token = decorator_from_middleware(VerifyG2SMiddleware)
@@ -11,4 +11,6 @@ urlpatterns = [
     path('reset-counts', reset_country_counts, name='reset-counts'),
     path('recent-logs', get_recent_logs, name='recent-logs'),
     path('persistent-stats', get_persistent_stats),
+    path('attack-rate', get_attack_rate, name='attack-rate'),
+    path('geoip-stats', get_geoip_stats, name='geoip-stats'),
 ]
@@ -4,53 +4,19 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from collections import defaultdict
 from datetime import datetime
-from .geoip_utils import init_geoip, ip_to_country
-import json
-import os
-
-STATS_FILE = os.path.join(os.path.dirname(__file__), "stats.json")
-
-# Default stats structure
-default_stats = {
-    "total_attacks": 0,
-    "unique_ips": [],
-    "unique_countries": [],
-    "timestamps": []
-}
-
-# Load stats.json if exists, else create
-# def load_stats():
-#     if os.path.exists(STATS_FILE):
-#         with open(STATS_FILE, "r") as f:
-#             return json.load(f)
-#     else:
-#         with open(STATS_FILE, "w") as f:
-#             json.dump(default_stats, f)
-#         return default_stats
-def load_stats():
-    # If file does not exist → create default
-    if not os.path.exists(STATS_FILE):
-        save_stats(default_stats)
-        return default_stats
+from .geoip_utils import init_geoip, ip_to_country, geoip_stats
+from .recent_logs import RecentLogs, parse_cursor
+from .stats_store import StatsAggregator
 
-    try:
-        with open(STATS_FILE, "r") as f:
-            content = f.read().strip()
-            if not content:
-                # file exists but empty → reset
-                save_stats(default_stats)
-                return default_stats
-
-            return json.loads(content)
-
-    except json.JSONDecodeError:
-        # File corrupted → reset it
-        save_stats(default_stats)
-        return default_stats
+# Units accepted by /attack-rate's resolution and range, e.g. "5m", "24h"
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_DURATION_NAMES = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_MAX_RATE_POINTS = 3600
 
-def save_stats(data):
-    with open(STATS_FILE, "w") as f:
-        json.dump(data, f)
+# Persistent stats: kept in memory, loaded once from stats.json and
+# flushed back in the background (see stats_store.py)
+stats = StatsAggregator()
+stats.start()
 
 # Initialize GeoIP on module load
 init_geoip()
@@ -58,9 +24,9 @@ init_geoip()
 # In-memory storage for country counts
 _country_counts = defaultdict(int)
 
-# In-memory storage for recent logs
-_recent_logs = []
-_max_recent_logs = 1000
+# In-memory storage for recent logs (ring buffer of RECENT_LOGS_CAPACITY)
+_recent_logs = RecentLogs()
+_default_recent_limit = 1000
 
 @api_view(['POST'])
 def send_log(request):
@@ -94,33 +60,11 @@ def send_log(request):
         enriched_log["timestamp"] = datetime.utcnow().isoformat() + "Z"
         print(f"Added timestamp: {enriched_log['timestamp']}")
 
-    # Load existing stats
-    stats = load_stats()
-
-    # Update total attacks
-    stats["total_attacks"] += 1
-
-    # Track unique IPs
-    if ip and ip not in stats["unique_ips"]:
-        stats["unique_ips"].append(ip)
+    # Update totals, unique IPs/countries and the attack-rate counters
+    stats.record(ip=ip, country=country_iso)
 
-    # Track unique countries
-    if country_iso and country_iso not in stats["unique_countries"]:
-        stats["unique_countries"].append(country_iso)
-
-    # Track timestamp for rate calculations
-    stats["timestamps"].append(enriched_log["timestamp"])
-    if len(stats["timestamps"]) > 50000:
-        stats["timestamps"] = stats["timestamps"][-50000:]  # keep recent window
-
-    # Save back to disk
-    save_stats(stats)
-
-    # Store the enriched log
-    global _recent_logs
+    # Store the enriched log; this also tags it with its "seq"
     _recent_logs.append(enriched_log)
-    if len(_recent_logs) > _max_recent_logs:
-        _recent_logs = _recent_logs[-_max_recent_logs:]
 
     # Broadcast the ENRICHED log to WebSocket clients
     channel_layer = get_channel_layer()
@@ -140,27 +84,77 @@ def get_country_counts(request):
 
 @api_view(['POST'])
 def reset_country_counts(request):
-    global _country_counts, _recent_logs
+    global _country_counts
     _country_counts = defaultdict(int)
-    _recent_logs = []
+    _recent_logs.clear()
     return Response({"status": "reset", "counts": {}})
 
 @api_view(['GET'])
 def get_recent_logs(request):
-    limit = request.query_params.get('limit', _max_recent_logs)
+    """
+    The newest `limit` logs, or with `since=<cursor>` only the logs after
+    that cursor. Pass back `next_since` as the next `since`.
+    """
+    limit = request.query_params.get('limit', _default_recent_limit)
     try:
         limit = int(limit)
-        limit = min(limit, _max_recent_logs)
+        limit = max(0, min(limit, _recent_logs.capacity))
     except (ValueError, TypeError):
-        limit = _max_recent_logs
-    
-    recent = _recent_logs[-limit:] if limit < len(_recent_logs) else _recent_logs
+        limit = _default_recent_limit
+
+    since = epoch = None
+    if request.query_params.get('since') is not None:
+        try:
+            epoch, since = parse_cursor(request.query_params['since'])
+        except ValueError:
+            return Response({"status": "error", "message": "since must be a next_since cursor"}, status=400)
+
+    page = _recent_logs.read(limit, since, epoch)
     return Response({
-        "logs": recent,
-        "total": len(_recent_logs),
-        "returned": len(recent)
+        "logs": page["logs"],
+        "total": page["held"],
+        "returned": len(page["logs"]),
+        "epoch": page["epoch"],
+        "first_seq": page["first_seq"],
+        "last_seq": page["last_seq"],
+        "next_since": page["next_since"],
+        "missed": page["missed"],
+        "restarted": page["restarted"],
     })
 
+@api_view(['GET'])
+def get_geoip_stats(request):
+    return Response(geoip_stats())
+
 @api_view(['GET'])
 def get_persistent_stats(request):
-    return Response(load_stats())
\ No newline at end of file
+    return Response(stats.snapshot())
+
+def _parse_duration(value: str) -> int:
+    """Seconds in "90", "15m", "24h", "7d" or "minute"; ValueError otherwise."""
+    value = value.strip().lower()
+    if value in _DURATION_NAMES:
+        return _DURATION_NAMES[value]
+    unit = _DURATION_UNITS.get(value[-1:])
+    seconds = int(value[:-1]) * unit if unit else int(value)
+    if seconds <= 0:
+        raise ValueError("duration must be positive")
+    return seconds
+
+@api_view(['GET'])
+def get_attack_rate(request):
+    """
+    Attack counts per `resolution` over the last `range` (defaults: minute,
+    1h), oldest first, from the in-memory rate counters.
+    """
+    try:
+        resolution = _parse_duration(request.query_params.get('resolution', 'minute'))
+        span = _parse_duration(request.query_params.get('range', '1h'))
+    except ValueError:
+        return Response({"status": "error", "message": "resolution and range must be durations like 60, 5m, 24h or 7d"}, status=400)
+    if span // resolution > _MAX_RATE_POINTS:
+        return Response({"status": "error", "message": f"At most {_MAX_RATE_POINTS} points per request"}, status=400)
+    try:
+        return Response(stats.attack_rate(resolution, span))
+    except ValueError as e:
+        return Response({"status": "error", "message": str(e)}, status=400)
@@ -2,19 +2,11 @@ from fastapi import FastAPI, Request
 from pydantic import BaseModel
 from datetime import datetime
 from typing import List, Optional
-import math
 
-app = FastAPI(title="Honeypot Log Classifier", version="1.0")
-
-# ========================== Utility Functions ==========================
-
-def shannon_entropy(s: Optional[str]) -> float:
-    """Calculate entropy of a string."""
-    if not s:
-        return 0.0
-    prob = [float(s.count(c)) / len(s) for c in dict.fromkeys(s)]
-    return -sum([p * math.log(p, 2) for p in prob])
+# Memoized, single-pass implementation shared with api2
+from features import shannon_entropy
 
+app = FastAPI(title="Honeypot Log Classifier", version="1.0")
 
 # ========================== Feature Extraction ==========================
 
@@ -1,171 +1,64 @@
-from fastapi import FastAPI, Depends
-from pydantic import BaseModel
+from fastapi import FastAPI, Depends, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 from datetime import datetime
-import math
-
-from g2s_auth import verify_g2s_token
-
-app = FastAPI(title="Adaptive Honeypot Log Classifier", version="3.0")
-
-# ========================== Utility Functions ==========================
-
-def shannon_entropy(s: Optional[str]) -> float:
-    """Calculate Shannon entropy of a string."""
-    if not s:
-        return 0.0
-    prob = [float(s.count(c)) / len(s) for c in dict.fromkeys(s)]
-    return -sum(p * math.log(p, 2) for p in prob)
-
-def avg_time_gap(logs_window):
-    """Compute average time gap (ms) between consecutive events."""
-    timestamps = sorted(log["timestamp"] for log in logs_window)
-    if len(timestamps) < 2:
-        return 999999.0
-    deltas = [timestamps[i + 1] - timestamps[i] for i in range(len(timestamps) - 1)]
-    return sum(deltas) / len(deltas)
-
-def reuse_rate(logs_window):
-    """Compute reuse ratio of (username, password) pairs."""
-    total = len(logs_window)
-    if total == 0:
-        return 0.0
-    creds = [(log.get("username"), log.get("password")) for log in logs_window]
-    unique_creds = len(set(creds))
-    return 1.0 - (unique_creds / total)
-
-# ========================== Feature Extraction ==========================
-
-def extract_features(current_log: dict, recent_logs: list):
-    """Extract relevant statistical and contextual features."""
-    src_ip = current_log["src_ip"]
-    logs_window = [log for log in recent_logs if log["src_ip"] == src_ip]
-
-    total_attempts = len(logs_window)
-    failed_attempts = sum(1 for log in logs_window if "failed" in log["eventid"])
-    success_attempts = sum(1 for log in logs_window if "success" in log["eventid"])
-    failed_ratio = failed_attempts / total_attempts if total_attempts else 0
-
-    usernames = [log["username"] for log in logs_window if log.get("username")]
-    passwords = [log["password"] for log in logs_window if log.get("password")]
-
-    unique_usernames = len(set(usernames))
-    unique_passwords = len(set(passwords))
-
-    username_entropy = (
-        sum(shannon_entropy(u) for u in usernames) / len(usernames)
-        if usernames else 0
-    )
-    password_entropy = (
-        sum(shannon_entropy(p) for p in passwords) / len(passwords)
-        if passwords else 0
-    )
+import base64
+import time
 
-    avg_delay = avg_time_gap(logs_window)
-    reuse_ratio = reuse_rate(logs_window)
+from g2s_auth import verify_g2s_token, token_cache_stats
+from features import extract_features, extract_features_by_ip, entropy_cache_stats
+from window_store import WindowStore
+from dedup import DedupCache
+from snapshot import SnapshotScheduler
+from columnar import NUMPY_AVAILABLE, extract_features_columnar
+from executor import executor_from_env
+from binary_format import CONTENT_TYPE as BINARY_CONTENT_TYPE, decode_request
+from rules import RuleEngine
+from wordlists import wordlists
+from responses import DEFAULT_PROFILE, FastJSONResponse, Profile, dumps, response_stats, shape
 
-    # Derived
-    attempts_per_min = total_attempts  # assuming window is 1 minute
-    success_ratio = success_attempts / total_attempts if total_attempts else 0
+app = FastAPI(
+    title="Adaptive Honeypot Log Classifier", version="3.0", default_response_class=FastJSONResponse
+)
 
-    return {
-        "attempts_from_ip_last_1min": total_attempts,
-        "failed_attempt_ratio_last_1min": failed_ratio,
-        "unique_usernames_from_ip_last_1min": unique_usernames,
-        "unique_passwords_from_ip_last_1min": unique_passwords,
-        "username_entropy": username_entropy,
-        "password_entropy": password_entropy,
-        "avg_delay_ms_between_attempts": avg_delay,
-        "success_attempts": success_attempts,
-        "attempts_per_min": attempts_per_min,
-        "reuse_ratio": reuse_ratio,
-        "success_ratio": success_ratio,
-    }
+# Per-IP event windows for stateful requests (no recent_logs supplied)
+window_store = WindowStore()
+
+# Retried events get their first result back instead of entering the window twice
+dedup = DedupCache()
+
+# Periodic on-disk snapshots of window_store, restored at startup (see snapshot.py)
+snapshots = SnapshotScheduler(window_store)
+
+# Shared windows at least this large are scored with the NumPy engine
+COLUMNAR_MIN_WINDOW = 10000
+
+# Where parsing, feature extraction and rules run (see executor.py)
+executor = executor_from_env()
+
+# Longest accepted line on /predict/stream
+STREAM_MAX_LINE_BYTES = 64 * 1024
 
 # ========================== Classification Rules ==========================
+# Thresholds live in rules.json (see rules.py) and are hot-reloaded.
+
+rule_engine = RuleEngine()
 
 def classify_attack_basic(features, current_log=None):
     """
     Classify log as benign / suspicious / attack.
     Returns: (label: str, risk_score: float)
     """
-    attempts = features["attempts_from_ip_last_1min"]
-    fail_ratio = features["failed_attempt_ratio_last_1min"]
-    uniq_users = features["unique_usernames_from_ip_last_1min"]
-    uniq_pwds = features["unique_passwords_from_ip_last_1min"]
-    avg_delay = features["avg_delay_ms_between_attempts"]
-    entropy_u = features["username_entropy"]
-    entropy_p = features["password_entropy"]
-    success_ratio = features["success_ratio"]
-    reuse = features["reuse_ratio"]
-
-    # Honeypot: any success → high-risk attack
-    if current_log and "success" in current_log["eventid"]:
-        return "attack", 0.98
-
-    # Strong brute-force pattern
-    if attempts >= 10 and fail_ratio >= 0.8 and avg_delay < 2000:
-        return "attack", 0.93
-
-    # Rapid automated access
-    if avg_delay < 1000 or attempts > 20:
-        return "attack", 0.9
-
-    # Many usernames or passwords → suspicious enumeration
-    if uniq_users > 5 or uniq_pwds > 5:
-        return "suspicious", 0.65
-
-    # High entropy credentials → possible bot
-    if entropy_u > 3.0 or entropy_p > 3.0:
-        return "suspicious", 0.6
-
-    # Moderate activity but some reuse → mild suspicion
-    if reuse > 0.3 and fail_ratio > 0.5:
-        return "suspicious", 0.55
-
-    # Low attempts, normal delay → benign
-    return "benign", 0.2
+    return rule_engine.classify_basic(features, current_log)
 
 def classify_attack_type(features):
     """
     Multi-class subtype classification for confirmed attacks.
     Returns: (attack_type: str, confidence: float)
     """
-    attempts = features["attempts_from_ip_last_1min"]
-    uniq_users = features["unique_usernames_from_ip_last_1min"]
-    uniq_pwds = features["unique_passwords_from_ip_last_1min"]
-    entropy_u = features["username_entropy"]
-    entropy_p = features["password_entropy"]
-    avg_delay = features["avg_delay_ms_between_attempts"]
-    reuse = features["reuse_ratio"]
-    success_ratio = features["success_ratio"]
-
-    # Brute-force: few users, many passwords, fast attempts
-    if uniq_users <= 2 and uniq_pwds >= 6 and avg_delay < 2000:
-        return "brute_force", 0.9
-
-    # Credential stuffing: many users, few passwords, some successes
-    if uniq_users >= 5 and uniq_pwds <= 3 and success_ratio > 0.0:
-        return "credential_stuffing", 0.85
-
-    # Dictionary attack: many usernames + many passwords, low entropy
-    if uniq_users >= 4 and uniq_pwds >= 6 and (entropy_p < 3.0):
-        return "dictionary_attack", 0.8
-
-    # Bot login: very low delay, high entropy credentials
-    if avg_delay < 800 and (entropy_u > 2.5 or entropy_p > 2.5):
-        return "bot_login", 0.75
-
-    # Username enumeration: many usernames, low password variety
-    if uniq_users >= 10 and uniq_pwds <= 3:
-        return "username_enumeration", 0.7
-
-    # Password spray: one/few passwords across many usernames, slow rate
-    if uniq_pwds <= 2 and uniq_users >= 8 and avg_delay > 2000:
-        return "password_spray", 0.8
-
-    # Otherwise
-    return "unknown_attack", 0.4
+    return rule_engine.classify_attack_type(features)
 
 # ========================== FastAPI Schemas ==========================
 
@@ -179,17 +72,19 @@ class LogEntry(BaseModel):
 
 class InputData(BaseModel):
     current_log: LogEntry
-    recent_logs: List[LogEntry]
+    # Omit to use the server-side window (stateful mode);
+    # send it explicitly for backfills (stateless mode).
+    recent_logs: Optional[List[LogEntry]] = None
 
-# ========================== Endpoint ==========================
+class BatchInputData(BaseModel):
+    current_logs: List[LogEntry]
+    # Shared window for every log in the batch; omit for stateful mode.
+    recent_logs: Optional[List[LogEntry]] = None
 
-@app.post("/predict")
-async def predict_attack(data: InputData, g2s=Depends(verify_g2s_token)):
-    """Predict if a login attempt is benign, suspicious, or attack."""
-    current_log = data.current_log.dict()
-    recent_logs = [log.dict() for log in data.recent_logs]
+# ========================== Result Assembly ==========================
 
-    features = extract_features(current_log, recent_logs)
+def build_result(current_log: dict, features: dict) -> dict:
+    """Run both classifiers and shape the /predict response."""
     classification, risk_score = classify_attack_basic(features, current_log)
 
     result = {
@@ -215,6 +110,271 @@ async def predict_attack(data: InputData, g2s=Depends(verify_g2s_token)):
 
     return result
 
+def shape_result(result: dict, profile: str) -> dict:
+    """Apply a response profile (see responses.py); debug also names the rule table version."""
+    if profile == "debug" and "classification" in result:
+        return {**result, "rules_version": rule_engine.version}
+    return shape(result, profile)
+
+# ========================== Classification Jobs ==========================
+# Module-level so they can be shipped to the executor's process pool.
+
+def _parse(model, body: bytes):
+    """Validate a raw JSON body, reporting errors like FastAPI would."""
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False)
+        for error in errors:
+            error["loc"] = ("body", *error["loc"])
+        raise RequestValidationError(errors)
+
+def _predict_binary(body: bytes):
+    """_predict_job for the column-oriented msgpack format (binary_format.py)."""
+    current_payload, window = decode_request(body)
+    try:
+        current_log = LogEntry.model_validate(current_payload).model_dump()
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False)
+        for error in errors:
+            error["loc"] = ("body", "current_log", *error["loc"])
+        raise RequestValidationError(errors)
+
+    if window is None:
+        return current_log, None
+    if isinstance(window, list):
+        features = extract_features(current_log, window)
+    else:
+        src_ip = current_log["src_ip"]
+        features = extract_features_columnar(window, {src_ip})[src_ip]
+    return current_log, build_result(current_log, features)
+
+def _predict_job(body: bytes, content_type: str = "application/json"):
+    """
+    Parse a /predict body and classify it if it carries its own window.
+    Returns (current_log, result); result is None in stateful mode, since
+    the window store lives in the main process.
+    """
+    if content_type == BINARY_CONTENT_TYPE:
+        return _predict_binary(body)
+
+    data = _parse(InputData, body)
+    current_log = data.current_log.model_dump()
+    if data.recent_logs is None:
+        return current_log, None
+    recent_logs = [log.model_dump() for log in data.recent_logs]
+    return current_log, build_result(current_log, extract_features(current_log, recent_logs))
+
+def _classify_new_event(current_log: dict) -> dict:
+    return build_result(current_log, window_store.add(current_log))
+
+def _classify_stateful(current_log: dict) -> dict:
+    return dedup.classify(current_log, _classify_new_event)
+
+def _batch_job(body: bytes):
+    """Like _predict_job for /predict/batch; returns (current_logs, results)."""
+    data = _parse(BatchInputData, body)
+    current_logs = [log.model_dump() for log in data.current_logs]
+    if data.recent_logs is None:
+        return current_logs, None
+
+    recent_logs = [log.model_dump() for log in data.recent_logs]
+    src_ips = {log["src_ip"] for log in current_logs}
+    if NUMPY_AVAILABLE and len(recent_logs) >= COLUMNAR_MIN_WINDOW:
+        by_ip = extract_features_columnar(recent_logs, src_ips)
+    else:
+        by_ip = extract_features_by_ip(recent_logs, src_ips)
+    return current_logs, [build_result(log, by_ip[log["src_ip"]]) for log in current_logs]
+
+def _classify_stateful_batch(current_logs: list) -> list:
+    return [_classify_stateful(log) for log in current_logs]
+
+# ========================== Endpoint ==========================
+
+@app.post("/predict")
+async def predict_attack(request: Request, profile: Optional[Profile] = None, g2s=Depends(verify_g2s_token)):
+    """
+    Predict if a login attempt is benign, suspicious, or attack. ?profile=
+    picks the response fields (minimal / standard / debug, see responses.py).
+
+    The body (InputData) is parsed inside the executor job rather than by
+    FastAPI, so large windows do not block the event loop. Bodies sent as
+    application/x-msgpack use the column-oriented format in binary_format.py.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    current_log, result = await executor.run(_predict_job, body, content_type, size=len(body))
+    if result is None:
+        result = await executor.run(_classify_stateful, current_log, size=0, shared_state=True)
+    profile = profile or DEFAULT_PROFILE
+    return FastJSONResponse(shape_result(result, profile), profile=profile)
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, profile: Optional[Profile] = None, g2s=Depends(verify_g2s_token)):
+    """
+    Classify many logs in one request (BatchInputData). Results come back in
+    input order.
+
+    Stateless: the shared window is grouped by src_ip in one pass and each
+    distinct IP's features are computed once. Stateful: logs are fed to the
+    window store in input order, so each one sees the events before it.
+    """
+    body = await request.body()
+    current_logs, results = await executor.run(_batch_job, body, size=len(body))
+    if results is None:
+        results = await executor.run(
+            _classify_stateful_batch, current_logs, size=len(body), shared_state=True
+        )
+
+    profile = profile or DEFAULT_PROFILE
+    return FastJSONResponse({
+        "results": [shape_result(r, profile) for r in results],
+        "count": len(current_logs),
+    }, profile=profile, results=max(len(results), 1))
+
+# ========================== Streaming Endpoint ==========================
+
+async def _ndjson_lines(chunks, max_line_bytes: int):
+    """
+    Split a byte stream into lines. Lines longer than `max_line_bytes` are
+    yielded as None (and never buffered whole); blank lines are skipped.
+    """
+    buffer = bytearray()
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(buffer[:end])
+            del buffer[:end + 1]
+            if oversized or len(line) > max_line_bytes:
+                oversized = False
+                yield None
+            elif line.strip():
+                yield line
+        if len(buffer) > max_line_bytes:
+            buffer.clear()
+            oversized = True
+    if oversized:
+        yield None
+    elif buffer.strip():
+        yield bytes(buffer)
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that does not listen for disconnects on `receive`.
+
+    On older ASGI spec versions Starlette reads `receive` concurrently to
+    spot disconnects, which would steal body chunks from a handler that
+    is still consuming the request. Here the body iterator reads the request
+    itself, and request.stream() raises ClientDisconnect on disconnect.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def _classify_stream(lines, profile: str):
+    number = 0
+    async for line in lines:
+        number += 1
+        if line is None:
+            result = {"line": number, "error": f"Line longer than {STREAM_MAX_LINE_BYTES} bytes"}
+        else:
+            try:
+                current_log = LogEntry.model_validate_json(line).model_dump()
+                result = await executor.run(_classify_stateful, current_log, size=0, shared_state=True)
+            except ValidationError as e:
+                result = {"line": number, "error": e.errors(include_url=False, include_context=False)}
+        start = time.perf_counter()
+        body = dumps(shape_result(result, profile))
+        response_stats.record(profile, len(body) + 1, time.perf_counter() - start)
+        yield body + b"\n"
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request, profile: Optional[Profile] = None, g2s=Depends(verify_g2s_token)):
+    """
+    Classify a continuous feed: the body is newline-delimited LogEntry JSON
+    (sent chunked), the response streams one NDJSON result per input line,
+    in order. Every event goes through the server-side window (stateful
+    mode). Bad lines produce {"line": n, "error": ...} and the stream goes on.
+
+    Backpressure: reading, classifying and writing happen in one pull-based
+    generator. The next body chunk is only read once the previous results
+    have been handed to the server, and the server's send waits while the
+    client's socket buffer is full. A slow reader therefore slows ingestion
+    instead of growing a buffer; at most one chunk plus one partial line is
+    held.
+    """
+    lines = _ndjson_lines(request.stream(), STREAM_MAX_LINE_BYTES)
+    return DuplexStreamingResponse(
+        _classify_stream(lines, profile or DEFAULT_PROFILE), media_type="application/x-ndjson"
+    )
+
+@app.get("/window-stats")
+def window_stats(sketches: bool = False, g2s=Depends(verify_g2s_token)):
+    """
+    Size of the server-side window state. With ?sketches=true the fleet-wide
+    HyperLogLog sketches are included (base64), so a shard router can merge
+    distinct counts across workers.
+    """
+    stats = window_store.stats()
+    if sketches:
+        stats["fleet_sketches"] = {
+            horizon: {name: base64.b64encode(data).decode() for name, data in pair.items()}
+            for horizon, pair in window_store.fleet_sketches().items()
+        }
+    return stats
+
+@app.get("/rules")
+def get_rules(g2s=Depends(verify_g2s_token)):
+    """Active rule tables, their version and the last load error."""
+    return rule_engine.stats()
+
+@app.post("/rules/reload")
+def reload_rules(g2s=Depends(verify_g2s_token)):
+    """Re-read the rules file now instead of waiting for the mtime check."""
+    ok = rule_engine.reload()
+    return {"reloaded": ok, **rule_engine.stats()}
+
+@app.get("/executor-stats")
+def executor_stats(g2s=Depends(verify_g2s_token)):
+    """Queue depth, rejections and queue-wait/execution-time percentiles."""
+    return executor.stats()
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    executor.shutdown()
+
+@app.on_event("startup")
+def restore_window_state():
+    snapshots.start()
+
+@app.on_event("shutdown")
+def snapshot_window_state():
+    snapshots.stop()
+
+@app.get("/snapshot-stats")
+def snapshot_stats(g2s=Depends(verify_g2s_token)):
+    """Cost of the last window snapshot and restore, to tune ML_SNAPSHOT_INTERVAL."""
+    return snapshots.stats()
+
+@app.get("/response-stats")
+def get_response_stats(g2s=Depends(verify_g2s_token)):
+    """Results served, payload bytes and serialization time per response profile."""
+    return response_stats.stats()
+
+@app.get("/cache-stats")
+def cache_stats(g2s=Depends(verify_g2s_token)):
+    """Hit rates of the service's in-process caches."""
+    return {
+        "entropy": entropy_cache_stats(),
+        "g2s_token": token_cache_stats(),
+        "wordlist": wordlists.stats(),
+        "dedup": dedup.stats(),
+    }
+
 # ========================== Root ==========================
 
 @app.get("/")
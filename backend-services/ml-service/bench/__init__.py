@@ -0,0 +1,13 @@
+"""
+Benchmarks for the ML service. Run from the ml-service directory:
+
+    python -m bench.harness     end-to-end /predict throughput/latency + baselines
+    python -m bench.load        event-loop latency under large windows
+    python -m bench.columnar    NumPy vs per-dict feature extraction
+    python -m bench.accumulator incremental per-IP features vs recomputing the window
+    python -m bench.entropy     memoized credential entropy
+    python -m bench.shards      shard router throughput vs a single worker
+    python -m bench.responses   payload size and JSON encoding time per response profile
+
+bench.traffic holds the seeded Cowrie-style traffic generator they share.
+"""
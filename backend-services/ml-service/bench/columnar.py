@@ -0,0 +1,68 @@
+"""
+Columnar vs per-dict feature extraction at 1k, 100k and 1M events.
+
+    python -m bench.columnar [--sizes 1000 100000 1000000] [--ips 500]
+
+Per-dict `extract_features` rescans the window for every IP, so at large
+sizes it is timed on a sample of IPs and scaled up (marked "est.").
+"""
+import argparse
+import random
+import time
+
+from features import extract_features, extract_features_by_ip
+from columnar import NUMPY_AVAILABLE, extract_features_columnar, to_columns
+
+USERNAMES = ["root", "admin", "ubuntu", "test", "oracle", "pi", "user", "guest"]
+PASSWORDS = ["123456", "password", "admin", "root", "toor", "12345678", "qwerty", "1234"]
+EVENTS = ["cowrie.login.failed"] * 8 + ["cowrie.login.success", "cowrie.session.connect"]
+
+def make_window(n: int, n_ips: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    ips = [f"203.0.{i // 256}.{i % 256}" for i in range(n_ips)]
+    return [
+        {
+            "timestamp": 1_700_000_000_000 + rnd.randint(0, 60_000),
+            "src_ip": rnd.choice(ips),
+            "username": rnd.choice(USERNAMES),
+            "password": rnd.choice(PASSWORDS) if rnd.random() < 0.8 else f"pw{rnd.randint(0, 10**6)}",
+            "eventid": rnd.choice(EVENTS),
+            "message": "login attempt",
+        }
+        for _ in range(n)
+    ]
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - start, out
+
+def run(sizes, n_ips, sample_ips=20):
+    print(f"{'events':>10} {'per-dict':>14} {'one-pass dict':>14} {'encode':>10} {'columnar':>10} {'speedup':>8}")
+    for n in sizes:
+        logs = make_window(n, n_ips)
+        ips = sorted({log["src_ip"] for log in logs})
+
+        sample = ips if len(ips) * n <= 5 * 10**7 else ips[:sample_ips]
+        t_dict, _ = _time(lambda: [extract_features({"src_ip": ip}, logs) for ip in sample])
+        t_dict *= len(ips) / len(sample)
+        est = "" if sample is ips else " est."
+
+        t_pass, by_ip = _time(extract_features_by_ip, logs)
+        t_enc, cols = _time(to_columns, logs)
+        t_col, _ = _time(extract_features_columnar, cols)
+
+        print(f"{n:>10} {t_dict:>9.3f}s{est:<4} {t_pass:>13.3f}s {t_enc:>9.3f}s {t_col:>9.3f}s "
+              f"{t_pass / t_col:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--ips", type=int, default=500, help="distinct source IPs in the window")
+    args = parser.parse_args()
+    if not NUMPY_AVAILABLE:
+        raise SystemExit("numpy is required for this benchmark")
+    run(args.sizes, args.ips)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+In-process benchmark harness for /predict.
+
+    python -m bench.harness                          # run and print
+    python -m bench.harness --save-baseline          # record bench/baselines.json
+    python -m bench.harness --compare                # fail on regressions
+
+Drives the real FastAPI app (no network) with a seeded stream from
+bench.traffic. Each configuration is either stateful (current_log only) or
+stateless with the last W events as recent_logs, like the ETL consumer's
+payload. Throughput and p50/p95/p99 latency are reported per configuration,
+plus the label distribution.
+
+`--compare` exits non-zero if any configuration's labels differ from the
+baseline (a classifier or extract_features change). It also fails if
+throughput drops by more than `--tolerance` or p99 grows by more than
+`--p99-tolerance` (tails are noisier). Timing baselines are
+machine-specific; re-record them when changing hardware.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from collections import Counter
+
+import jwt
+from fastapi.testclient import TestClient
+
+import api2
+from bench.traffic import BURST_SHAPES, generate
+from executor import ClassifierExecutor, EXECUTION_MODES
+from g2s_auth import G2S_SECRET
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+def _pct(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] if ordered else 0.0
+
+def run_config(client, headers, events, window):
+    """Send every event; `window` is None for stateful mode."""
+    api2.window_store.clear()
+    api2.dedup.clear()
+    for event in events[:50]:  # warm up caches and code paths
+        client.post("/predict", json={"current_log": event}, headers=headers)
+    api2.window_store.clear()
+    api2.dedup.clear()  # the warm-up events are replayed for real
+
+    latencies = []
+    labels = Counter()
+    for i, event in enumerate(events):
+        payload = {"current_log": event}
+        if window is not None:
+            payload["recent_logs"] = events[max(0, i - window + 1):i + 1]
+        body = json.dumps(payload)
+
+        start = time.perf_counter()
+        r = client.post("/predict", content=body, headers=headers)
+        latencies.append(time.perf_counter() - start)
+
+        r.raise_for_status()
+        result = r.json()
+        labels[f"{result['classification']}/{result['attack_type']}"] += 1
+
+    total = sum(latencies)
+    return {
+        "requests": len(events),
+        "throughput_rps": round(len(events) / total, 1) if total else 0.0,
+        "p50_ms": round(_pct(latencies, 50) * 1000, 3),
+        "p95_ms": round(_pct(latencies, 95) * 1000, 3),
+        "p99_ms": round(_pct(latencies, 99) * 1000, 3),
+        "labels": dict(sorted(labels.items())),
+    }
+
+def run(args) -> dict:
+    events = generate(args.events, n_ips=args.ips, shape=args.shape, seed=args.seed)
+    token = jwt.encode({"exp": int(time.time()) + 3600}, G2S_SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    api2.executor.shutdown()
+    api2.executor = ClassifierExecutor(mode=args.execution_mode)
+    # Start cold and leave no snapshot behind
+    api2.snapshots.enabled = False
+
+    results = {}
+    with TestClient(api2.app) as client:
+        configs = [("stateful", None)] + [(f"stateless_w{w}", w) for w in args.windows]
+        for name, window in configs:
+            results[name] = run_config(client, headers, events, window)
+            r = results[name]
+            print(f"{name:<18} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.3f}ms  "
+                  f"p95 {r['p95_ms']:>8.3f}ms  p99 {r['p99_ms']:>8.3f}ms")
+
+    api2.executor.shutdown()
+    return {
+        "config": {
+            "events": args.events, "ips": args.ips, "shape": args.shape,
+            "seed": args.seed, "windows": args.windows,
+            "execution_mode": args.execution_mode,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float, p99_tolerance: float) -> bool:
+    """Print a comparison and return True if nothing regressed."""
+    if current["config"] != baseline["config"]:
+        print("Baseline was recorded with a different configuration:")
+        print(f"  baseline {baseline['config']}")
+        print(f"  current  {current['config']}")
+        return False
+
+    ok = True
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None:
+            print(f"FAIL {name}: missing from current run")
+            ok = False
+            continue
+
+        problems = []
+        if cur["labels"] != base["labels"]:
+            changed = sorted(set(cur["labels"]) | set(base["labels"]))
+            diff = {k: (base["labels"].get(k, 0), cur["labels"].get(k, 0)) for k in changed
+                    if base["labels"].get(k, 0) != cur["labels"].get(k, 0)}
+            problems.append(f"labels changed (baseline, current): {diff}")
+        if cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            problems.append(f"throughput {cur['throughput_rps']} < {base['throughput_rps']} req/s")
+        if cur["p99_ms"] > base["p99_ms"] * (1 + p99_tolerance):
+            problems.append(f"p99 {cur['p99_ms']} > {base['p99_ms']} ms")
+
+        if problems:
+            ok = False
+            print(f"FAIL {name}: " + "; ".join(problems))
+        else:
+            print(f"ok   {name}: {cur['throughput_rps']} req/s (baseline {base['throughput_rps']})")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--ips", type=int, default=100)
+    parser.add_argument("--shape", choices=BURST_SHAPES, default="burst")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--windows", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--execution-mode", choices=EXECUTION_MODES, default="inline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative throughput drop")
+    parser.add_argument("--p99-tolerance", type=float, default=1.0,
+                        help="allowed relative p99 growth")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", module="jwt")
+    current = run(args)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(current, baseline, args.tolerance, args.p99_tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Event-loop load test: small /predict latency while large windows are in flight.
+
+    python -m bench.load [--modes inline thread process] [--window 20000]
+                         [--heavy 2] [--duration 5]
+
+For each execution mode, `--heavy` clients keep posting stateless requests
+with a `--window`-event recent_logs, while a probe client sends small
+requests every few milliseconds. With the work on the event loop (inline),
+probe p99 tracks the cost of a whole large request. With a pool, it should
+stay close to the idle baseline. Bodies are serialized up front so the
+client does not compete for the loop.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import jwt
+
+import api2
+from bench.columnar import make_window
+from executor import ClassifierExecutor
+from g2s_auth import G2S_SECRET
+
+def _headers():
+    token = jwt.encode({"exp": int(time.time()) + 3600}, G2S_SECRET, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+def _body(window: list) -> bytes:
+    return json.dumps({"current_log": window[-1], "recent_logs": window}).encode()
+
+def _pct(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] * 1000 if ordered else 0.0
+
+async def _probe(client, headers, body, stop_at, interval, latencies):
+    while time.monotonic() < stop_at:
+        start = time.monotonic()
+        r = await client.post("/predict", content=body, headers=headers)
+        r.raise_for_status()
+        latencies.append(time.monotonic() - start)
+        await asyncio.sleep(interval)
+
+async def _heavy(client, headers, body, stop_at, counter):
+    while time.monotonic() < stop_at:
+        r = await client.post("/predict", content=body, headers=headers)
+        if r.status_code == 200:
+            counter[0] += 1
+        else:
+            await asyncio.sleep(0.01)  # 503: queue full, back off
+
+async def run_mode(mode, heavy_body, probe_body, heavy, duration, interval):
+    api2.executor.shutdown()
+    api2.executor = ClassifierExecutor(mode=mode)
+    headers = _headers()
+    transport = httpx.ASGITransport(app=api2.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/predict", content=heavy_body, headers=headers)  # warm up pools
+
+        idle = []
+        await _probe(client, headers, probe_body, time.monotonic() + 1.0, interval, idle)
+
+        loaded = []
+        done = [0]
+        stop_at = time.monotonic() + duration
+        await asyncio.gather(
+            _probe(client, headers, probe_body, stop_at, interval, loaded),
+            *(_heavy(client, headers, heavy_body, stop_at, done) for _ in range(heavy)),
+        )
+
+    stats = api2.executor.stats()
+    print(f"{mode:<8} idle p99 {_pct(idle, 99):7.2f}ms | loaded p50 {_pct(loaded, 50):7.2f}ms "
+          f"p95 {_pct(loaded, 95):7.2f}ms p99 {_pct(loaded, 99):7.2f}ms | "
+          f"large done {done[0]:4d} | queue-wait p99 {stats['queue_wait']['p99_ms']:.2f}ms "
+          f"exec p99 {stats['execution']['p99_ms']:.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--window", type=int, default=20_000, help="events per large request")
+    parser.add_argument("--heavy", type=int, default=2, help="concurrent large-request clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds under load per mode")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between probes")
+    args = parser.parse_args()
+
+    heavy_body = _body(make_window(args.window, 50))
+    probe_body = _body(make_window(10, 1, seed=1))
+    for mode in args.modes:
+        asyncio.run(run_mode(mode, heavy_body, probe_body, args.heavy, args.duration, args.interval))
+    api2.executor.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Payload size and serialization cost of each /predict response profile.
+
+    python -m bench.responses [--events 20000] [--repeat 5]
+
+Classifies seeded traffic in stateful mode (so results carry the horizon
+features too), then encodes every result under each profile with
+Starlette's JSONResponse encoder and with responses.dumps (orjson when
+installed). Reports bytes per result and microseconds per result.
+"""
+import argparse
+import time
+
+from starlette.responses import JSONResponse
+
+import api2
+from bench.traffic import generate
+from responses import ORJSON_AVAILABLE, PROFILES, dumps
+
+def _time(encode, payloads, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            encode(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    api2.snapshots.enabled = False
+    api2.window_store.clear()
+    api2.dedup.clear()
+    results = [api2._classify_stateful(event) for event in generate(args.events, seed=args.seed)]
+    api2.window_store.clear()
+
+    starlette = JSONResponse(None).render
+    fast_name = "orjson" if ORJSON_AVAILABLE else "json (compact)"
+    print(f"{len(results)} results; fast encoder: {fast_name}")
+    print(f"{'profile':<10} {'bytes/result':>12} {'starlette us':>13} {'fast us':>9} {'speedup':>8}")
+    for profile in PROFILES:
+        payloads = [api2.shape_result(r, profile) for r in results]
+        size = sum(len(dumps(p)) for p in payloads) / len(payloads)
+        slow = _time(starlette, payloads, args.repeat) / len(payloads) * 1e6
+        fast = _time(dumps, payloads, args.repeat) / len(payloads) * 1e6
+        print(f"{profile:<10} {size:>12.1f} {slow:>13.2f} {fast:>9.2f} {slow / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Parity check and timing for the compiled rule engine.
+
+    python -m bench.rules [--events 20000]
+
+Compares the default rules.json against frozen copies of the original
+hand-written if-chains, for single feature dicts and for array batches. The
+inputs are features from generated traffic plus a random grid around every
+threshold. Exits non-zero on any mismatch. Then times each evaluator.
+"""
+import argparse
+import random
+import sys
+import time
+
+from bench.traffic import generate
+from columnar import FEATURE_NAMES, NUMPY_AVAILABLE
+from features import extract_features_by_ip
+from rules import RULES_PATH, load_tables
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+# ========================== Reference Rules ==========================
+# The if-chains as they were in api2.py before the rule table existed.
+
+def reference_basic(features, current_log=None):
+    """
+    Classify log as benign / suspicious / attack.
+    Returns: (label: str, risk_score: float)
+    """
+    attempts = features["attempts_from_ip_last_1min"]
+    fail_ratio = features["failed_attempt_ratio_last_1min"]
+    uniq_users = features["unique_usernames_from_ip_last_1min"]
+    uniq_pwds = features["unique_passwords_from_ip_last_1min"]
+    avg_delay = features["avg_delay_ms_between_attempts"]
+    entropy_u = features["username_entropy"]
+    entropy_p = features["password_entropy"]
+    success_ratio = features["success_ratio"]
+    reuse = features["reuse_ratio"]
+
+    # Honeypot: any success → high-risk attack
+    if current_log and "success" in current_log["eventid"]:
+        return "attack", 0.98
+
+    # Strong brute-force pattern
+    if attempts >= 10 and fail_ratio >= 0.8 and avg_delay < 2000:
+        return "attack", 0.93
+
+    # Rapid automated access
+    if avg_delay < 1000 or attempts > 20:
+        return "attack", 0.9
+
+    # Many usernames or passwords → suspicious enumeration
+    if uniq_users > 5 or uniq_pwds > 5:
+        return "suspicious", 0.65
+
+    # High entropy credentials → possible bot
+    if entropy_u > 3.0 or entropy_p > 3.0:
+        return "suspicious", 0.6
+
+    # Moderate activity but some reuse → mild suspicion
+    if reuse > 0.3 and fail_ratio > 0.5:
+        return "suspicious", 0.55
+
+    # Low attempts, normal delay → benign
+    return "benign", 0.2
+
+def reference_attack_type(features):
+    """
+    Multi-class subtype classification for confirmed attacks.
+    Returns: (attack_type: str, confidence: float)
+    """
+    attempts = features["attempts_from_ip_last_1min"]
+    uniq_users = features["unique_usernames_from_ip_last_1min"]
+    uniq_pwds = features["unique_passwords_from_ip_last_1min"]
+    entropy_u = features["username_entropy"]
+    entropy_p = features["password_entropy"]
+    avg_delay = features["avg_delay_ms_between_attempts"]
+    reuse = features["reuse_ratio"]
+    success_ratio = features["success_ratio"]
+
+    # Brute-force: few users, many passwords, fast attempts
+    if uniq_users <= 2 and uniq_pwds >= 6 and avg_delay < 2000:
+        return "brute_force", 0.9
+
+    # Credential stuffing: many users, few passwords, some successes
+    if uniq_users >= 5 and uniq_pwds <= 3 and success_ratio > 0.0:
+        return "credential_stuffing", 0.85
+
+    # Dictionary attack: many usernames + many passwords, low entropy
+    if uniq_users >= 4 and uniq_pwds >= 6 and (entropy_p < 3.0):
+        return "dictionary_attack", 0.8
+
+    # Bot login: very low delay, high entropy credentials
+    if avg_delay < 800 and (entropy_u > 2.5 or entropy_p > 2.5):
+        return "bot_login", 0.75
+
+    # Username enumeration: many usernames, low password variety
+    if uniq_users >= 10 and uniq_pwds <= 3:
+        return "username_enumeration", 0.7
+
+    # Password spray: one/few passwords across many usernames, slow rate
+    if uniq_pwds <= 2 and uniq_users >= 8 and avg_delay > 2000:
+        return "password_spray", 0.8
+
+    # Otherwise
+    return "unknown_attack", 0.4
+
+# ========================== Inputs ==========================
+
+_GRID = {
+    "attempts_from_ip_last_1min": [0, 1, 9, 10, 11, 20, 21, 50],
+    "failed_attempt_ratio_last_1min": [0, 0.5, 0.51, 0.79, 0.8, 1.0],
+    "unique_usernames_from_ip_last_1min": [0, 1, 2, 3, 4, 5, 6, 8, 10, 12],
+    "unique_passwords_from_ip_last_1min": [0, 1, 2, 3, 5, 6, 7],
+    "username_entropy": [0, 1.0, 2.5, 2.51, 3.0, 3.01],
+    "password_entropy": [0, 1.0, 2.5, 2.51, 3.0, 3.01],
+    "avg_delay_ms_between_attempts": [0, 799, 800, 999, 1000, 1999, 2000, 2001, 999999.0],
+    "success_attempts": [0, 1],
+    "attempts_per_min": [0, 10],
+    "reuse_ratio": [0.0, 0.3, 0.31, 0.9],
+    "success_ratio": [0, 0.0, 0.1],
+    "dictionary_credential_ratio": [0.0, 0.5, 1.0],
+}
+_EVENTIDS = ["cowrie.login.failed", "cowrie.login.success", "cowrie.session.connect"]
+
+def make_inputs(n_events: int, n_grid: int, seed: int = 0):
+    rnd = random.Random(seed)
+    events = generate(n_events, n_ips=max(n_events // 20, 1), seed=seed)
+    rows = []
+    for i in range(0, len(events), 20):
+        window = events[max(0, i - 200):i + 1]
+        current = events[i]
+        rows.append((extract_features_by_ip(window, {current["src_ip"]})[current["src_ip"]], current))
+    for _ in range(n_grid):
+        features = {name: rnd.choice(values) for name, values in _GRID.items()}
+        rows.append((features, {"eventid": rnd.choice(_EVENTIDS)}))
+    return rows
+
+# ========================== Checks ==========================
+
+def check_parity(tables, rows) -> int:
+    basic, attack_type = tables["basic"], tables["attack_type"]
+    mismatches = 0
+    for features, current in rows:
+        for got, want in (
+            (basic.evaluate(features, current), reference_basic(features, current)),
+            (basic.evaluate(features), reference_basic(features)),
+            (attack_type.evaluate(features), reference_attack_type(features)),
+        ):
+            if got != want:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"MISMATCH {got} != {want} for {features}")
+
+    if NUMPY_AVAILABLE:
+        arrays = {name: np.array([f[name] for f, _ in rows]) for name in FEATURE_NAMES}
+        current = {"eventid": [c["eventid"] for _, c in rows]}
+        for table, ref, cur in (
+            (basic, lambda f, c: reference_basic(f, c), current),
+            (attack_type, lambda f, c: reference_attack_type(f), None),
+        ):
+            labels, scores = table.evaluate_arrays(arrays, cur)
+            for i, (features, c) in enumerate(rows):
+                want = ref(features, c)
+                if (labels[i], scores[i]) != want:
+                    mismatches += 1
+                    if mismatches <= 5:
+                        print(f"ARRAY MISMATCH {table.name} row {i}: {(labels[i], scores[i])} != {want}")
+    return mismatches
+
+def _time(label, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1e9 / count:>10.0f} ns/row")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--grid", type=int, default=50_000)
+    args = parser.parse_args()
+
+    tables = load_tables(RULES_PATH)
+    rows = make_inputs(args.events, args.grid)
+    mismatches = check_parity(tables, rows)
+    print(f"{len(rows)} feature rows, {mismatches} mismatches")
+
+    basic = tables["basic"]
+    _time("reference if-chain", lambda: [reference_basic(f, c) for f, c in rows], len(rows))
+    _time("compiled rules (scalar)", lambda: [basic.evaluate(f, c) for f, c in rows], len(rows))
+    if NUMPY_AVAILABLE:
+        arrays = {name: np.array([f[name] for f, _ in rows]) for name in FEATURE_NAMES}
+        current = {"eventid": [c["eventid"] for _, c in rows]}
+        _time("compiled rules (arrays)", lambda: basic.evaluate_arrays(arrays, current), len(rows))
+
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
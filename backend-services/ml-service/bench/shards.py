@@ -0,0 +1,112 @@
+"""
+Multi-core throughput of the sharded deployment (shard_router.py).
+
+    python -m bench.shards [--workers 1 2 4] [--events 5000] [--concurrency 32]
+
+For each worker count, starts the router with that many api2 workers and
+replays a seeded traffic stream (bench.traffic) as stateful /predict
+requests from `--concurrency` concurrent clients. Also measures one plain
+api2 worker without the router, to show the router's own overhead.
+
+Scaling needs free cores: with W workers plus the router, expect gains up
+to about min(W, cores - 1). Stateful features depend on arrival order, so
+only throughput and latency are compared here; see bench.harness for
+label checks.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import jwt
+
+from bench.traffic import generate
+from g2s_auth import G2S_SECRET
+from shard_router import wait_ready
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _pct(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] * 1000 if ordered else 0.0
+
+def _start(workers: int):
+    """Start a router with `workers` shards (0 = a bare api2 worker); return (process, url)."""
+    port = _free_port()
+    env = dict(os.environ, ML_SNAPSHOT_PATH="")  # benchmark from a cold, unsaved state
+    if workers:
+        cmd = [sys.executable, "shard_router.py", "--workers", str(workers), "--host", "127.0.0.1",
+               "--port", str(port), "--worker-port-base", str(_free_port())]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "api2:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=HERE, env=env)
+    url = f"http://127.0.0.1:{port}"
+    wait_ready([url], timeout=60.0)
+    return proc, url
+
+async def _drive(url: str, bodies: list, concurrency: int, headers: dict):
+    latencies = []
+    queue = iter(bodies)
+
+    async def client_loop(client):
+        for body in queue:
+            start = time.perf_counter()
+            r = await client.post("/predict", content=body, headers=headers)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        for body in bodies[:20]:  # warm up
+            await client.post("/predict", content=body, headers=headers)
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+def run(workers: int, bodies: list, concurrency: int, headers: dict) -> dict:
+    proc, url = _start(workers)
+    try:
+        elapsed, latencies = asyncio.run(_drive(url, bodies, concurrency, headers))
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_pct(latencies, 50), 3),
+        "p99_ms": round(_pct(latencies, 99), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--ips", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    token = jwt.encode({"exp": int(time.time()) + 3600}, G2S_SECRET, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    events = generate(args.events, n_ips=args.ips, seed=args.seed)
+    bodies = [json.dumps({"current_log": e}).encode() for e in events]
+
+    print(f"{os.cpu_count()} CPUs, {args.events} stateful requests, concurrency {args.concurrency}")
+    configs = [("api2 (no router)", 0)] + [(f"router + {w} workers", w) for w in args.workers]
+    for name, workers in configs:
+        r = run(workers, bodies, args.concurrency, headers)
+        print(f"{name:<20} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.3f}ms  p99 {r['p99_ms']:>8.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Seeded generator of Cowrie-style honeypot traffic.
+
+Each source IP is an "actor" playing one scenario:
+
+    benign               a few slow logins, mostly the same credentials
+    brute_force          one or two usernames, many passwords, fast
+    credential_stuffing  leaked username/password pairs, occasional success
+    password_spray       one or two passwords across many usernames, slow
+    bot_login            random high-entropy credentials, very fast
+
+Burst shapes control when actors start within the run:
+
+    steady  spread uniformly
+    burst   clustered into a few short bursts
+    ramp    increasingly dense towards the end
+
+The output is a list of LogEntry-shaped dicts sorted by timestamp, identical
+for the same arguments.
+"""
+import random
+import string
+from typing import Dict, List, Optional
+
+SCENARIOS = ("benign", "brute_force", "credential_stuffing", "password_spray", "bot_login")
+BURST_SHAPES = ("steady", "burst", "ramp")
+
+DEFAULT_MIX = {
+    "benign": 0.4,
+    "brute_force": 0.2,
+    "credential_stuffing": 0.15,
+    "password_spray": 0.1,
+    "bot_login": 0.15,
+}
+
+USERNAMES = [
+    "root", "admin", "ubuntu", "test", "oracle", "pi", "user", "guest", "postgres",
+    "git", "ftpuser", "support", "deploy", "hadoop", "mysql", "www", "nagios", "jenkins",
+]
+PASSWORDS = [
+    "123456", "password", "admin", "root", "toor", "12345678", "qwerty", "1234",
+    "12345", "111111", "raspberry", "changeme", "P@ssw0rd", "admin123", "letmein",
+    "passw0rd", "123123", "abc123", "default", "ubuntu",
+]
+
+# (events per actor range, delay range in ms, success probability)
+_PROFILES = {
+    "benign": ((1, 4), (5_000, 30_000), 0.3),
+    "brute_force": ((15, 60), (200, 1_500), 0.02),
+    "credential_stuffing": ((8, 30), (800, 3_000), 0.08),
+    "password_spray": ((10, 25), (3_000, 10_000), 0.01),
+    "bot_login": ((10, 40), (50, 500), 0.02),
+}
+
+def _random_string(rnd: random.Random, lo: int, hi: int) -> str:
+    alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
+    return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(lo, hi)))
+
+def _credentials(scenario: str, rnd: random.Random, count: int):
+    if scenario == "benign":
+        user, pwd = rnd.choice(USERNAMES), rnd.choice(PASSWORDS)
+        return [(user, pwd if rnd.random() < 0.8 else rnd.choice(PASSWORDS)) for _ in range(count)]
+    if scenario == "brute_force":
+        users = rnd.sample(USERNAMES[:4], rnd.randint(1, 2))
+        return [(rnd.choice(users), rnd.choice(PASSWORDS) if rnd.random() < 0.5 else _random_string(rnd, 6, 10))
+                for _ in range(count)]
+    if scenario == "credential_stuffing":
+        pairs = [(f"{rnd.choice(USERNAMES)}{rnd.randint(1, 999)}", rnd.choice(PASSWORDS[:3]))
+                 for _ in range(max(count // 2, 1))]
+        return [rnd.choice(pairs) for _ in range(count)]
+    if scenario == "password_spray":
+        pwds = rnd.sample(PASSWORDS[:5], rnd.randint(1, 2))
+        return [(rnd.choice(USERNAMES), rnd.choice(pwds)) for _ in range(count)]
+    if scenario == "bot_login":
+        return [(_random_string(rnd, 8, 16), _random_string(rnd, 12, 24)) for _ in range(count)]
+    raise ValueError(f"Unknown scenario {scenario!r}")
+
+def _start_offset(shape: str, rnd: random.Random, duration_ms: int, bursts: List[int]) -> int:
+    if shape == "steady":
+        return rnd.randint(0, duration_ms)
+    if shape == "burst":
+        return max(0, min(duration_ms, int(rnd.gauss(rnd.choice(bursts), duration_ms * 0.01))))
+    if shape == "ramp":
+        return int(duration_ms * rnd.random() ** 0.5)
+    raise ValueError(f"Unknown burst shape {shape!r}, expected one of {BURST_SHAPES}")
+
+def _actor_events(scenario: str, ip: str, start: int, rnd: random.Random) -> List[dict]:
+    (lo, hi), (dlo, dhi), p_success = _PROFILES[scenario]
+    count = rnd.randint(lo, hi)
+    events = []
+    ts = start
+    for username, password in _credentials(scenario, rnd, count):
+        ts += rnd.randint(dlo, dhi)
+        ok = rnd.random() < p_success
+        events.append({
+            "timestamp": ts,
+            "src_ip": ip,
+            "username": username,
+            "password": password,
+            "eventid": "cowrie.login.success" if ok else "cowrie.login.failed",
+            "message": f"login attempt [{username}/{password}] {'succeeded' if ok else 'failed'}",
+        })
+    if rnd.random() < 0.2:
+        events.insert(0, {
+            "timestamp": start,
+            "src_ip": ip,
+            "username": None,
+            "password": None,
+            "eventid": "cowrie.session.connect",
+            "message": f"New connection: {ip}",
+        })
+    return events
+
+def generate(n_events: int, n_ips: int = 200, mix: Optional[Dict[str, float]] = None,
+             shape: str = "steady", duration_ms: int = 10 * 60 * 1000,
+             start_ms: int = 1_700_000_000_000, seed: int = 0) -> List[dict]:
+    """
+    Generate about `n_events` events from `n_ips` actors, sorted by time.
+
+    Actors are drawn from `mix` (scenario -> weight). IPs are reused
+    round-robin if more actors are needed to reach `n_events`, so an IP can
+    run several sessions.
+    """
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    scenarios = list(mix)
+    weights = [mix[s] for s in scenarios]
+    ips = [f"{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}"
+           for _ in range(n_ips)]
+    ip_scenarios = rnd.choices(scenarios, weights=weights, k=n_ips)
+    bursts = [rnd.randint(0, duration_ms) for _ in range(3)]
+
+    events = []
+    actor = 0
+    while len(events) < n_events:
+        i = actor % n_ips
+        start = start_ms + _start_offset(shape, rnd, duration_ms, bursts)
+        events.extend(_actor_events(ip_scenarios[i], ips[i], start, rnd))
+        actor += 1
+
+    events.sort(key=lambda e: e["timestamp"])
+    return events[:n_events]
@@ -0,0 +1,179 @@
+"""
+Compact column-oriented request format for /predict.
+
+Sent with `Content-Type: application/x-msgpack`. The body is a msgpack map:
+
+    {
+      "current_log": {timestamp, src_ip, username, password, eventid, message},
+      "recent_logs": {                         # optional; omit for stateful mode
+        "timestamp": [int, ...] | bin,         # bin = little-endian int64s
+        "src_ip":    [code, ...],
+        "username":  [code, ...],
+        "password":  [code, ...],
+        "eventid":   [code, ...],
+        "dict": {
+          "src_ip":   [str, ...],
+          "username": [str | nil, ...],
+          "password": [str | nil, ...],
+          "eventid":  [str, ...],
+        },
+      },
+    }
+
+Each string column is dictionary-encoded: codes index into the matching
+`dict` list, so repeated IPs and credentials are sent once. msgpack arrays
+and bins are length-prefixed. `message` is not needed by the feature engine
+and is not sent for the window. With numpy the columns are decoded straight
+into a LogColumns; no per-row dicts or pydantic models are built.
+"""
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from columnar import NUMPY_AVAILABLE, LogColumns
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    print("WARNING: msgpack not installed. Install with: pip install msgpack")
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+CONTENT_TYPE = "application/x-msgpack"
+_CODED = ("src_ip", "username", "password", "eventid")
+
+# ========================== Encoding ==========================
+
+def encode_columns(logs: List[dict], binary_timestamps: bool = True) -> dict:
+    """Dictionary-encode a window of log dicts into the recent_logs layout."""
+    tables = {name: {} for name in _CODED}
+    columns = {name: [] for name in _CODED}
+    for log in logs:
+        for name in _CODED:
+            table = tables[name]
+            value = log.get(name)
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            columns[name].append(code)
+
+    timestamps = [log["timestamp"] for log in logs]
+    if binary_timestamps and NUMPY_AVAILABLE:
+        timestamps = np.asarray(timestamps, dtype="<i8").tobytes()
+
+    return {
+        "timestamp": timestamps,
+        **columns,
+        "dict": {name: list(table) for name, table in tables.items()},
+    }
+
+def encode_request(current_log: dict, recent_logs: Optional[List[dict]] = None) -> bytes:
+    """Build a /predict body in the binary format (used by clients and benchmarks)."""
+    payload = {"current_log": current_log}
+    if recent_logs is not None:
+        payload["recent_logs"] = encode_columns(recent_logs)
+    return msgpack.packb(payload, use_bin_type=True)
+
+# ========================== Decoding ==========================
+
+def _malformed(detail: str):
+    return HTTPException(status_code=400, detail=f"Malformed msgpack payload: {detail}")
+
+def _check_codes(name: str, codes: list, size: int, n: int):
+    """Validate a code column and return it (as an int64 array with numpy)."""
+    if len(codes) != n:
+        raise _malformed(f"recent_logs.{name} has {len(codes)} entries, expected {n}")
+    if not n:
+        return np.zeros(0, dtype=np.int64) if NUMPY_AVAILABLE else codes
+
+    if NUMPY_AVAILABLE:
+        codes = np.asarray(codes)
+        if codes.ndim != 1 or codes.dtype.kind not in "iu":
+            raise _malformed(f"recent_logs.{name} codes must be a flat array of integers")
+        lo, hi = codes.min(), codes.max()
+    else:
+        if not all(type(c) is int for c in codes):
+            raise _malformed(f"recent_logs.{name} codes must be a flat array of integers")
+        lo, hi = min(codes), max(codes)
+
+    if lo < 0 or hi >= size:
+        raise _malformed(f"recent_logs.{name} has codes outside its dictionary")
+    return codes
+
+def _decode_timestamps(raw) -> list:
+    if isinstance(raw, (bytes, bytearray)):
+        if len(raw) % 8:
+            raise _malformed("recent_logs.timestamp is not a whole number of int64s")
+        if NUMPY_AVAILABLE:
+            return np.frombuffer(raw, dtype="<i8")
+        return [int.from_bytes(raw[i:i + 8], "little", signed=True) for i in range(0, len(raw), 8)]
+    if not isinstance(raw, list) or not all(isinstance(t, int) for t in raw):
+        raise _malformed("recent_logs.timestamp must be a list of ints or int64 bytes")
+    return raw
+
+def _decode_window(window: dict):
+    """Return LogColumns when numpy is available, else a list of log dicts."""
+    if not isinstance(window, dict) or not isinstance(window.get("dict"), dict):
+        raise _malformed("recent_logs must be a map with a 'dict' entry")
+    tables = window["dict"]
+    timestamps = _decode_timestamps(window.get("timestamp", []))
+    n = len(timestamps)
+
+    codes = {}
+    for name in _CODED:
+        table, column = tables.get(name), window.get(name)
+        if not isinstance(table, list) or not isinstance(column, list):
+            raise _malformed(f"recent_logs.{name} and its dictionary must be arrays")
+        codes[name] = _check_codes(name, column, len(table), n)
+    for name in ("src_ip", "eventid"):
+        if not all(isinstance(v, str) for v in tables[name]):
+            raise _malformed(f"recent_logs dictionary {name} must contain strings")
+    for name in ("username", "password"):
+        if not all(v is None or isinstance(v, str) for v in tables[name]):
+            raise _malformed(f"recent_logs dictionary {name} must contain strings or nil")
+
+    if not NUMPY_AVAILABLE:
+        return [
+            {
+                "timestamp": timestamps[i],
+                "src_ip": tables["src_ip"][codes["src_ip"][i]],
+                "username": tables["username"][codes["username"][i]],
+                "password": tables["password"][codes["password"][i]],
+                "eventid": tables["eventid"][codes["eventid"][i]],
+            }
+            for i in range(n)
+        ]
+
+    # Event flags are evaluated once per distinct eventid, then gathered
+    eventids = tables["eventid"]
+    event_codes = codes["eventid"]
+    failed = np.fromiter(("failed" in e for e in eventids), dtype=bool, count=len(eventids))
+    success = np.fromiter(("success" in e for e in eventids), dtype=bool, count=len(eventids))
+    return LogColumns(
+        timestamps, codes["src_ip"], codes["username"], codes["password"],
+        failed[event_codes], success[event_codes],
+        tables["src_ip"], tables["username"], tables["password"],
+    )
+
+def decode_request(body: bytes) -> Tuple[dict, Optional[object]]:
+    """
+    Decode a binary /predict body into (current_log payload, window).
+
+    The window is None in stateful mode, a LogColumns with numpy, or a list
+    of log dicts without it. current_log is returned unvalidated; the caller
+    checks it against LogEntry.
+    """
+    if not MSGPACK_AVAILABLE:
+        raise HTTPException(status_code=415, detail="msgpack support is not installed")
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise _malformed(str(e) or type(e).__name__)
+    if not isinstance(payload, dict) or "current_log" not in payload:
+        raise _malformed("expected a map with 'current_log'")
+
+    window = payload.get("recent_logs")
+    return payload["current_log"], None if window is None else _decode_window(window)
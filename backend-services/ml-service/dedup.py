@@ -0,0 +1,95 @@
+"""
+Short-lived cache of stateful results, so retried events are idempotent.
+
+The gateway and the ETL consumer retry /predict after timeouts. Without this,
+a retry would be added to the IP's window a second time and inflate every
+count. Each event is fingerprinted by (timestamp, src_ip, eventid, username,
+password). A repeat inside the TTL gets the original result back and does
+not touch the window store.
+
+Bounded by ML_DEDUP_SIZE entries (default 10000) and ML_DEDUP_TTL seconds
+of wall-clock time (default 120); ML_DEDUP_TTL=0 disables the cache. An
+entry holds the full result (~1.5 KB with features), so the default cap
+is ~15 MB.
+"""
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+import os
+import time
+
+DEDUP_SIZE = int(os.getenv("ML_DEDUP_SIZE", "10000"))
+DEDUP_TTL = float(os.getenv("ML_DEDUP_TTL", "120"))
+
+def fingerprint(log: dict) -> bytes:
+    """Stable 128-bit key for an event; None and "" credentials differ."""
+    key = (log["timestamp"], log["src_ip"], log["eventid"], log.get("username"), log.get("password"))
+    return blake2b(repr(key).encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+class DedupCache:
+    """
+    fingerprint -> result, oldest first. Entries are never refreshed, so
+    insertion order is expiry order and expired ones are popped from the front.
+    """
+
+    def __init__(self, max_size: int = DEDUP_SIZE, ttl: float = DEDUP_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = ttl > 0 and max_size > 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def _expire(self, now: float):
+        entries = self._entries
+        while entries:
+            expires, _ = next(iter(entries.values()))
+            if expires > now:
+                break
+            entries.popitem(last=False)
+            self.expired += 1
+
+    def classify(self, log: dict, compute) -> dict:
+        """
+        Return `compute(log)`, or the cached result if this event was seen
+        within the TTL. The lock is held across compute, so concurrent
+        retries of one event cannot both reach the window store.
+        """
+        if not self.enabled:
+            return compute(log)
+        key = fingerprint(log)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            result = compute(log)
+            self._entries[key] = (now + self.ttl, result)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,144 @@
+"""
+Runs CPU-bound classification work off the FastAPI event loop.
+
+Modes (ML_EXECUTION_MODE):
+    inline   - run on the event loop (the old behaviour)
+    thread   - thread pool; keeps the loop responsive between GIL switches
+    process  - process pool for stateless work; jobs that touch in-process
+               state (the window store) still go to the thread pool
+
+Jobs whose payload is smaller than `inline_max_bytes` always run inline:
+handing a single small event to a pool costs more than classifying it, and
+it would queue behind the large windows the pool exists for. At most
+`max_pending` jobs may be queued or running in the pools; beyond that
+requests are rejected with 503 so a flood of large windows cannot pile up.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from typing import Optional
+import asyncio
+import os
+import time
+
+from fastapi import HTTPException
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+class _HTTPError:
+    """An HTTPException raised in a worker, as plain picklable data."""
+
+    def __init__(self, e: HTTPException):
+        self.status_code, self.detail, self.headers = e.status_code, e.detail, e.headers
+
+def _timed(fn, args):
+    # Runs inside the worker; time.monotonic() is system-wide, so start and
+    # finish can be compared with the submit time in the parent process.
+    started = time.monotonic()
+    try:
+        result = fn(*args)
+    except HTTPException as e:
+        # HTTPException cannot be unpickled (its args are empty), which would
+        # break the whole process pool, so it is returned and re-raised by run()
+        result = _HTTPError(e)
+    return started, time.monotonic(), result
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        f"p{q}_ms": round(ordered[min(last, int(len(ordered) * q / 100))] * 1000, 3)
+        for q in (50, 95, 99)
+    }
+
+class ClassifierExecutor:
+    """Bounded dispatcher with queue-wait and execution-time metrics."""
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None,
+                 max_pending: int = 64, inline_max_bytes: int = 64 * 1024,
+                 sample_size: int = 2048):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode {mode!r}, expected one of {EXECUTION_MODES}")
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.inline_max_bytes = inline_max_bytes
+        self._threads = ThreadPoolExecutor(self.max_workers) if mode != "inline" else None
+        self._processes = ProcessPoolExecutor(self.max_workers) if mode == "process" else None
+
+        self._pending = 0
+        self.completed = 0
+        self.inlined = 0
+        self.rejected = 0
+        self._queue_wait = deque(maxlen=sample_size)
+        self._exec_time = deque(maxlen=sample_size)
+
+    async def run(self, fn, *args, size: Optional[int] = None, shared_state: bool = False):
+        """
+        Run `fn(*args)` according to the execution mode and return its result.
+
+        `size` is the payload size in bytes; small payloads run inline. Set
+        `shared_state` for jobs that read or write in-process state; they
+        never go to the process pool. In process mode `fn` and its arguments
+        must be picklable (module-level functions, plain data).
+        """
+        if self.mode == "inline" or (size is not None and size < self.inline_max_bytes):
+            started = time.monotonic()
+            result = fn(*args)
+            self.inlined += 1
+            self._record(0.0, time.monotonic() - started)
+            return result
+
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Classifier queue full")
+
+        pool = self._threads if shared_state or self._processes is None else self._processes
+        self._pending += 1
+        submitted = time.monotonic()
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(
+                pool, _timed, fn, args
+            )
+        finally:
+            self._pending -= 1
+
+        self._record(started - submitted, finished - started)
+        if isinstance(result, _HTTPError):
+            raise HTTPException(result.status_code, result.detail, result.headers)
+        return result
+
+    def _record(self, queue_wait: float, exec_time: float):
+        self.completed += 1
+        self._queue_wait.append(queue_wait)
+        self._exec_time.append(exec_time)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "inline_max_bytes": self.inline_max_bytes,
+            "pending": self._pending,
+            "completed": self.completed,
+            "inlined": self.inlined,
+            "rejected": self.rejected,
+            "queue_wait": _percentiles(self._queue_wait),
+            "execution": _percentiles(self._exec_time),
+        }
+
+    def shutdown(self):
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+def executor_from_env() -> ClassifierExecutor:
+    workers = os.getenv("ML_EXECUTION_WORKERS")
+    return ClassifierExecutor(
+        mode=os.getenv("ML_EXECUTION_MODE", "thread"),
+        max_workers=int(workers) if workers else None,
+        max_pending=int(os.getenv("ML_MAX_PENDING", "64")),
+        inline_max_bytes=int(os.getenv("ML_INLINE_MAX_BYTES", str(64 * 1024))),
+    )
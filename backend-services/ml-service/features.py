@@ -0,0 +1,276 @@
+"""
+Feature extraction for the honeypot log classifier.
+
+`extract_features` recomputes everything from a window of logs (stateless
+mode, backfills). `FeatureAccumulator` keeps the same statistics up to date
+as events enter and leave a per-IP window, so stateful requests cost O(1)
+regardless of how busy the IP is.
+
+`dictionary_credential_ratio` is the share of attempts whose credentials
+all appear in the attack wordlists loaded by wordlists.py.
+"""
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+import math
+import os
+
+from wordlists import dictionary_credential
+
+# ========================== Utility Functions ==========================
+
+# Honeypot credentials repeat heavily ("root", "admin", "123456"), so
+# entropies are memoized. Override before import via ENTROPY_CACHE_SIZE.
+ENTROPY_CACHE_SIZE = int(os.getenv("ENTROPY_CACHE_SIZE", "65536"))
+
+@lru_cache(maxsize=ENTROPY_CACHE_SIZE)
+def _entropy(s: str) -> float:
+    # Counter is a single C-level pass; it keeps first-seen order, so the
+    # sum runs in the same order as the old dict.fromkeys/s.count version.
+    n = len(s)
+    return -sum((c / n) * math.log(c / n, 2) for c in Counter(s).values())
+
+def shannon_entropy(s: Optional[str]) -> float:
+    """Calculate Shannon entropy of a string."""
+    if not s:
+        return 0.0
+    return _entropy(s)
+
+# Entropy sums are kept in fixed point (integer units of 2**-32 bits) so
+# they are exact: adding and removing values in any order gives the same
+# total, and the mean is one correctly rounded division. 2**32 units per
+# bit keeps 10^6 events of 16-bit entropy inside an int64 for columnar.py.
+ENTROPY_SCALE = 1 << 32
+
+def entropy_units(s: Optional[str]) -> int:
+    """shannon_entropy(s) in fixed-point units."""
+    if not s:
+        return 0
+    return round(_entropy(s) * ENTROPY_SCALE)
+
+def mean_entropy(units: int, count: int):
+    """Mean entropy of `count` values whose entropy_units() sum to `units`."""
+    return units / count / ENTROPY_SCALE if count else 0
+
+def entropy_cache_stats() -> dict:
+    info = _entropy.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+def avg_time_gap(logs_window):
+    """Compute average time gap (ms) between consecutive events."""
+    timestamps = sorted(log["timestamp"] for log in logs_window)
+    if len(timestamps) < 2:
+        return 999999.0
+    deltas = [timestamps[i + 1] - timestamps[i] for i in range(len(timestamps) - 1)]
+    return sum(deltas) / len(deltas)
+
+def reuse_rate(logs_window):
+    """Compute reuse ratio of (username, password) pairs."""
+    total = len(logs_window)
+    if total == 0:
+        return 0.0
+    creds = [(log.get("username"), log.get("password")) for log in logs_window]
+    unique_creds = len(set(creds))
+    return 1.0 - (unique_creds / total)
+
+# ========================== Feature Extraction ==========================
+
+def extract_features(current_log: dict, recent_logs: list):
+    """Extract relevant statistical and contextual features."""
+    src_ip = current_log["src_ip"]
+    logs_window = [log for log in recent_logs if log["src_ip"] == src_ip]
+
+    total_attempts = len(logs_window)
+    failed_attempts = sum(1 for log in logs_window if "failed" in log["eventid"])
+    success_attempts = sum(1 for log in logs_window if "success" in log["eventid"])
+    failed_ratio = failed_attempts / total_attempts if total_attempts else 0
+
+    usernames = [log["username"] for log in logs_window if log.get("username")]
+    passwords = [log["password"] for log in logs_window if log.get("password")]
+
+    unique_usernames = len(set(usernames))
+    unique_passwords = len(set(passwords))
+
+    username_entropy = mean_entropy(sum(entropy_units(u) for u in usernames), len(usernames))
+    password_entropy = mean_entropy(sum(entropy_units(p) for p in passwords), len(passwords))
+
+    avg_delay = avg_time_gap(logs_window)
+    reuse_ratio = reuse_rate(logs_window)
+    dictionary_attempts = sum(
+        1 for log in logs_window if dictionary_credential(log.get("username"), log.get("password"))
+    )
+
+    # Derived
+    attempts_per_min = total_attempts  # assuming window is 1 minute
+    success_ratio = success_attempts / total_attempts if total_attempts else 0
+
+    return {
+        "attempts_from_ip_last_1min": total_attempts,
+        "failed_attempt_ratio_last_1min": failed_ratio,
+        "unique_usernames_from_ip_last_1min": unique_usernames,
+        "unique_passwords_from_ip_last_1min": unique_passwords,
+        "username_entropy": username_entropy,
+        "password_entropy": password_entropy,
+        "avg_delay_ms_between_attempts": avg_delay,
+        "success_attempts": success_attempts,
+        "attempts_per_min": attempts_per_min,
+        "reuse_ratio": reuse_ratio,
+        "success_ratio": success_ratio,
+        "dictionary_credential_ratio": dictionary_attempts / total_attempts if total_attempts else 0.0,
+    }
+
+def extract_features_by_ip(recent_logs: list, src_ips=None) -> dict:
+    """
+    Group the window by source IP in one pass and return {src_ip: features}.
+
+    Equivalent to calling `extract_features` once per IP. If `src_ips` is
+    given, only those IPs are accumulated and each is present in the result
+    (with empty-window features if it has no events).
+    """
+    accs = {}
+    bounds = {}
+    for log in recent_logs:
+        ip = log["src_ip"]
+        if src_ips is not None and ip not in src_ips:
+            continue
+        acc = accs.get(ip)
+        ts = log["timestamp"]
+        if acc is None:
+            acc = accs[ip] = FeatureAccumulator()
+            bounds[ip] = [ts, ts]
+        else:
+            b = bounds[ip]
+            if ts < b[0]:
+                b[0] = ts
+            elif ts > b[1]:
+                b[1] = ts
+        acc.add(log)
+
+    result = {ip: acc.features(*bounds[ip]) for ip, acc in accs.items()}
+    if src_ips is not None:
+        for ip in src_ips:
+            if ip not in result:
+                result[ip] = FeatureAccumulator().features()
+    return result
+
+# ========================== Incremental Features ==========================
+
+def _incr(counts: dict, key):
+    counts[key] = counts.get(key, 0) + 1
+
+def _decr(counts: dict, key):
+    n = counts[key] - 1
+    if n:
+        counts[key] = n
+    else:
+        del counts[key]
+
+class FeatureAccumulator:
+    """
+    Running statistics for one IP's window.
+
+    Unique usernames/passwords/credential pairs are reference-counted so
+    expiry can tell when the last copy leaves. Entropy is kept as a running
+    fixed-point sum (see entropy_units), so it matches `extract_features`
+    exactly however events enter and leave.
+    """
+
+    __slots__ = (
+        "total", "failed", "success", "dictionary",
+        "usernames", "passwords", "creds",
+        "username_count", "password_count",
+        "username_entropy_sum", "password_entropy_sum",
+    )
+
+    def __init__(self):
+        self.total = 0
+        self.failed = 0
+        self.success = 0
+        self.dictionary = 0
+        self.usernames = {}
+        self.passwords = {}
+        self.creds = {}
+        self.username_count = 0
+        self.password_count = 0
+        self.username_entropy_sum = 0
+        self.password_entropy_sum = 0
+
+    def add(self, log: dict):
+        self.total += 1
+        eventid = log["eventid"]
+        if "failed" in eventid:
+            self.failed += 1
+        if "success" in eventid:
+            self.success += 1
+
+        username = log.get("username")
+        password = log.get("password")
+        if username:
+            _incr(self.usernames, username)
+            self.username_count += 1
+            self.username_entropy_sum += entropy_units(username)
+        if password:
+            _incr(self.passwords, password)
+            self.password_count += 1
+            self.password_entropy_sum += entropy_units(password)
+        if dictionary_credential(username, password):
+            self.dictionary += 1
+        _incr(self.creds, (username, password))
+
+    def remove(self, log: dict):
+        self.total -= 1
+        eventid = log["eventid"]
+        if "failed" in eventid:
+            self.failed -= 1
+        if "success" in eventid:
+            self.success -= 1
+
+        username = log.get("username")
+        password = log.get("password")
+        if username:
+            _decr(self.usernames, username)
+            self.username_count -= 1
+            self.username_entropy_sum -= entropy_units(username)
+        if password:
+            _decr(self.passwords, password)
+            self.password_count -= 1
+            self.password_entropy_sum -= entropy_units(password)
+        if dictionary_credential(username, password):
+            self.dictionary -= 1
+        _decr(self.creds, (username, password))
+
+    def features(self, first_ts: Optional[int] = None, last_ts: Optional[int] = None) -> dict:
+        """
+        Build the same dict as `extract_features` for this window.
+
+        `first_ts`/`last_ts` are the oldest and newest timestamps in the
+        window; the mean gap between sorted timestamps telescopes to
+        (last - first) / (n - 1).
+        """
+        total = self.total
+        if total >= 2:
+            avg_delay = (last_ts - first_ts) / (total - 1)
+        else:
+            avg_delay = 999999.0
+
+        return {
+            "attempts_from_ip_last_1min": total,
+            "failed_attempt_ratio_last_1min": self.failed / total if total else 0,
+            "unique_usernames_from_ip_last_1min": len(self.usernames),
+            "unique_passwords_from_ip_last_1min": len(self.passwords),
+            "username_entropy": mean_entropy(self.username_entropy_sum, self.username_count),
+            "password_entropy": mean_entropy(self.password_entropy_sum, self.password_count),
+            "avg_delay_ms_between_attempts": avg_delay,
+            "success_attempts": self.success,
+            "attempts_per_min": total,  # assuming window is 1 minute
+            "reuse_ratio": 1.0 - (len(self.creds) / total) if total else 0.0,
+            "success_ratio": self.success / total if total else 0,
+            "dictionary_credential_ratio": self.dictionary / total if total else 0.0,
+        }
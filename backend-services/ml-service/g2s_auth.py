@@ -1,8 +1,57 @@
 import jwt
+import time
+from collections import OrderedDict
+from threading import Lock
 from fastapi import Header, HTTPException, Depends
 from typing import Optional
 
-G2S_SECRET = "ml-secret-key"  
+G2S_SECRET = "ml-secret-key"
+
+# Already-verified tokens: raw token -> (decoded claims, exp). The gateway
+# reuses one 5-minute token for thousands of events, so a hit skips the
+# HS256 check. Entries are dropped at the token's own exp; tokens without
+# exp and invalid tokens are never cached.
+TOKEN_CACHE_SIZE = 1024
+_token_cache = OrderedDict()
+_token_cache_lock = Lock()
+_token_cache_hits = 0
+_token_cache_misses = 0
+
+def _cached_claims(token: str):
+    global _token_cache_hits, _token_cache_misses
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is None:
+            _token_cache_misses += 1
+            return None
+        decoded, exp = entry
+        if exp <= time.time():
+            # Same condition PyJWT uses for ExpiredSignatureError
+            del _token_cache[token]
+            raise HTTPException(status_code=401, detail="Token expired")
+        _token_cache.move_to_end(token)
+        _token_cache_hits += 1
+        return decoded
+
+def _cache_claims(token: str, decoded: dict):
+    exp = decoded.get("exp")
+    if not isinstance(exp, (int, float)):
+        return
+    with _token_cache_lock:
+        _token_cache[token] = (decoded, exp)
+        _token_cache.move_to_end(token)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+def token_cache_stats() -> dict:
+    lookups = _token_cache_hits + _token_cache_misses
+    return {
+        "hits": _token_cache_hits,
+        "misses": _token_cache_misses,
+        "hit_rate": _token_cache_hits / lookups if lookups else 0.0,
+        "size": len(_token_cache),
+        "max_size": TOKEN_CACHE_SIZE,
+    }
 
 def verify_g2s_token(authorization: Optional[str] = Header(None)):
     if authorization is None or not authorization.startswith("Bearer "):
@@ -10,10 +59,16 @@ def verify_g2s_token(authorization: Optional[str] = Header(None)):
 
     token = authorization.split(" ")[1]
 
+    decoded = _cached_claims(token)
+    if decoded is not None:
+        return decoded
+
     try:
         decoded = jwt.decode(token, G2S_SECRET, algorithms=["HS256"])
-        return decoded  # attach decoded data for view usage
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+    _cache_claims(token, decoded)
+    return decoded  # attach decoded data for view usage
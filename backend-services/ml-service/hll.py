@@ -0,0 +1,195 @@
+"""
+HyperLogLog distinct counters.
+
+Used for unique usernames/passwords over the long horizons, where exact
+sets per IP would grow with the attack. Each sketch is a fixed array of
+2**p one-byte registers; the relative standard error is about 1.04/sqrt(2**p).
+The precision is derived from ML_HLL_ERROR (default 0.05, i.e. 512
+registers). Override it before import.
+
+Values are hashed with an unkeyed 64-bit BLAKE2b rather than hash(), so
+sketches built in different workers or processes can be merged (register-wise
+max) and serialized with to_bytes()/from_bytes().
+"""
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Iterable
+import math
+import os
+import sys
+
+from features import ENTROPY_CACHE_SIZE
+
+HLL_ERROR = float(os.getenv("ML_HLL_ERROR", "0.05"))
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+def precision_for(error: float) -> int:
+    """Smallest precision whose standard error is at most `error`."""
+    if not 0 < error < 1:
+        raise ValueError("HyperLogLog error bound must be between 0 and 1")
+    p = math.ceil(math.log2((1.04 / error) ** 2))
+    return max(MIN_PRECISION, min(MAX_PRECISION, p))
+
+DEFAULT_PRECISION = precision_for(HLL_ERROR)
+
+# Credentials repeat heavily, so register positions are memoized like entropies
+@lru_cache(maxsize=ENTROPY_CACHE_SIZE)
+def register_for(value: str, p: int = DEFAULT_PRECISION):
+    """Return the (register index, rank) that `value` sets in a 2**p sketch."""
+    x = int.from_bytes(blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+    rest = x & ((1 << (64 - p)) - 1)
+    return x >> (64 - p), 64 - p - rest.bit_length() + 1
+
+def _alpha(m: int) -> float:
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+class HyperLogLog:
+    """
+    A mergeable distinct-count sketch.
+
+    Small sketches are sparse: a sorted array of (index << 6 | rank) words,
+    4 bytes per set register, which is what most per-IP sketches stay at. A
+    sketch switches to the dense one-byte-per-register form once that would
+    be smaller. The number of zero registers and the harmonic sum are kept
+    up to date on every change, so count() is O(1).
+    """
+
+    __slots__ = ("p", "registers", "sparse", "zeros", "inv_sum")
+
+    def __init__(self, p: int = DEFAULT_PRECISION):
+        if not MIN_PRECISION <= p <= MAX_PRECISION:
+            raise ValueError(f"HyperLogLog precision must be {MIN_PRECISION}..{MAX_PRECISION}")
+        self.p = p
+        self.registers = None
+        self.sparse = array("I")
+        self.zeros = 1 << p
+        self.inv_sum = float(1 << p)
+
+    def add(self, value: str):
+        self.insert(*register_for(value, self.p))
+
+    def insert(self, index: int, rank: int):
+        """Apply a position from register_for(); lets callers hash once for many sketches."""
+        sparse = self.sparse
+        if sparse is None:
+            old = self.registers[index]
+            if rank <= old:
+                return
+            self.registers[index] = rank
+        else:
+            pos = bisect_left(sparse, index << 6)
+            if pos < len(sparse) and sparse[pos] >> 6 == index:
+                old = sparse[pos] & 63
+                if rank <= old:
+                    return
+                sparse[pos] = index << 6 | rank
+            else:
+                old = 0
+                sparse.insert(pos, index << 6 | rank)
+                if len(sparse) * sparse.itemsize >= 1 << self.p:
+                    self._densify()
+        if not old:
+            self.zeros -= 1
+        self.inv_sum += 2.0 ** -rank - 2.0 ** -old
+
+    def dense(self) -> bytearray:
+        """The registers as a bytearray (a copy for sparse sketches)."""
+        if self.sparse is None:
+            return self.registers
+        registers = bytearray(1 << self.p)
+        for word in self.sparse:
+            registers[word >> 6] = word & 63
+        return registers
+
+    def _densify(self):
+        self.registers = self.dense()
+        self.sparse = None
+
+    def _recount(self):
+        m = 1 << self.p
+        if self.sparse is None:
+            registers = self.registers
+            self.zeros = registers.count(0)
+            self.inv_sum = math.fsum(2.0 ** -r for r in registers)
+        else:
+            self.zeros = m - len(self.sparse)
+            self.inv_sum = self.zeros + math.fsum(2.0 ** -(w & 63) for w in self.sparse)
+
+    def merge(self, other: "HyperLogLog"):
+        """Fold `other` into this sketch (register-wise max)."""
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLog sketches of different precision")
+        if other.sparse is not None:
+            for word in other.sparse:
+                self.insert(word >> 6, word & 63)
+            return
+        self.registers = bytearray(map(max, self.dense(), other.registers))
+        self.sparse = None
+        self._recount()
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], p: int = DEFAULT_PRECISION) -> "HyperLogLog":
+        sketches = list(sketches)
+        if any(s.p != p for s in sketches):
+            raise ValueError("cannot merge HyperLogLog sketches of different precision")
+        dense = [s.registers for s in sketches if s.sparse is None]
+        result = cls(p)
+        if dense:
+            result.registers = bytearray(map(max, *dense)) if len(dense) > 1 else bytearray(dense[0])
+            result.sparse = None
+            result._recount()
+        for s in sketches:
+            if s.sparse is not None:
+                result.merge(s)
+        return result
+
+    def count(self) -> int:
+        m = 1 << self.p
+        if self.zeros == m:
+            return 0
+        estimate = _alpha(m) * m * m / self.inv_sum
+        if estimate <= 2.5 * m and self.zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / self.zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch. Dense sketches are the precision byte plus the
+        registers; sparse ones set the high bit of the first byte and follow
+        it with their little-endian uint32 words.
+        """
+        if self.sparse is None:
+            return bytes((self.p,)) + bytes(self.registers)
+        words = array("I", self.sparse)
+        if sys.byteorder == "big":
+            words.byteswap()
+        return bytes((self.p | 0x80,)) + words.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        sketch = cls(data[0] & 0x7F)
+        if data[0] & 0x80:
+            words = array("I")
+            words.frombytes(data[1:])
+            if sys.byteorder == "big":
+                words.byteswap()
+            if any(w >> 6 >= 1 << sketch.p for w in words):
+                raise ValueError("HyperLogLog payload has registers out of range")
+            sketch.sparse = array("I", sorted(words))
+        else:
+            if len(data) != 1 + (1 << sketch.p):
+                raise ValueError("HyperLogLog payload has the wrong length")
+            sketch.registers = bytearray(data[1:])
+            sketch.sparse = None
+        sketch._recount()
+        return sketch
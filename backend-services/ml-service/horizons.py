@@ -0,0 +1,394 @@
+"""
+Long-horizon behavioural aggregates per source IP.
+
+Slow password sprays and distributed credential stuffing stay under the
+1-minute thresholds but show up over 10 minutes, an hour or a day. Keeping
+raw events that long would cost memory proportional to the attack rate, so
+each horizon is a ring of at most BUCKETS_PER_HORIZON time buckets holding
+counters only. Memory per IP is bounded by the number of buckets, however
+many events arrive.
+
+A horizon covers the buckets overlapping (watermark - horizon, watermark],
+so its edge is accurate to one bucket (10 s for 10min, 1 min for 1h,
+24 min for 24h). Features are named like the 1-minute ones with a
+`_last_<horizon>` suffix; see HORIZON_FEATURES.
+
+Unique usernames/passwords cannot be summed across buckets, so each horizon
+also keeps HyperLogLog sketches (hll.py) for SKETCH_SLICES coarser slices,
+plus their running union. Distinct counts are therefore approximate, and
+their edge is accurate to one slice (horizon / SKETCH_SLICES).
+"""
+from typing import Dict
+
+from features import entropy_units, mean_entropy
+from hll import DEFAULT_PRECISION, HyperLogLog, register_for
+
+HORIZONS = {
+    "10min": 10 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "24h": 24 * 60 * 60 * 1000,
+}
+BUCKETS_PER_HORIZON = 60
+SKETCH_SLICES = 6
+
+HORIZON_FEATURES = (
+    "attempts_from_ip",
+    "failed_attempt_ratio",
+    "success_attempts",
+    "success_ratio",
+    "unique_usernames_from_ip",
+    "unique_passwords_from_ip",
+    "username_entropy",
+    "password_entropy",
+    "avg_delay_ms_between_attempts",
+    "attempts_per_min",
+)
+
+# ========================== Buckets ==========================
+
+class Bucket:
+    """Counters for one time slice of one IP."""
+
+    __slots__ = (
+        "index", "total", "failed", "success", "first_ts", "last_ts",
+        "username_count", "password_count", "username_entropy_sum", "password_entropy_sum",
+    )
+
+    def __init__(self, index: int, ts: int):
+        self.index = index
+        self.total = 0
+        self.failed = 0
+        self.success = 0
+        self.first_ts = ts
+        self.last_ts = ts
+        self.username_count = 0
+        self.password_count = 0
+        self.username_entropy_sum = 0
+        self.password_entropy_sum = 0
+
+BUCKET_FIELDS = Bucket.__slots__
+
+class SketchSlice:
+    """Distinct-value sketches for a run of consecutive buckets."""
+
+    __slots__ = ("index", "usernames", "passwords")
+
+    def __init__(self, index: int, precision: int):
+        self.index = index
+        self.usernames = HyperLogLog(precision)
+        self.passwords = HyperLogLog(precision)
+
+class HorizonRing:
+    """
+    Up to `buckets` non-empty buckets covering one horizon, plus running
+    totals over them so features are read in O(1).
+    """
+
+    __slots__ = (
+        "horizon_ms", "bucket_ms", "buckets",
+        "total", "failed", "success",
+        "username_count", "password_count", "username_entropy_sum", "password_entropy_sum",
+        "precision", "slice_buckets", "slices", "usernames", "passwords",
+    )
+
+    def __init__(self, horizon_ms: int, buckets: int = BUCKETS_PER_HORIZON,
+                 precision: int = DEFAULT_PRECISION):
+        self.horizon_ms = horizon_ms
+        self.bucket_ms = horizon_ms // buckets
+        # Plain lists: at most `buckets` entries, and far smaller than deques
+        self.buckets = []
+        self.precision = precision
+        self.slice_buckets = max(1, buckets // SKETCH_SLICES)
+        self.slices = []
+        # Union of every slice once there are two or more (a lone slice is
+        # its own union); rebuilt when a slice expires
+        self.usernames = None
+        self.passwords = None
+        self.total = 0
+        self.failed = 0
+        self.success = 0
+        self.username_count = 0
+        self.password_count = 0
+        self.username_entropy_sum = 0
+        self.password_entropy_sum = 0
+
+    def _bucket(self, ts: int):
+        """Find or create the bucket for `ts` (callers check `accepts` first)."""
+        index = ts // self.bucket_ms
+        buckets = self.buckets
+        if not buckets or index > buckets[-1].index:
+            bucket = Bucket(index, ts)
+            buckets.append(bucket)
+            return bucket
+        # Out-of-order arrival: walk back from the newest bucket
+        for pos in range(len(buckets) - 1, -1, -1):
+            bucket = buckets[pos]
+            if bucket.index == index:
+                return bucket
+            if bucket.index < index:
+                bucket = Bucket(index, ts)
+                buckets.insert(pos + 1, bucket)
+                return bucket
+        bucket = Bucket(index, ts)
+        buckets.insert(0, bucket)
+        return bucket
+
+    def _slice(self, bucket_index: int) -> SketchSlice:
+        index = bucket_index // self.slice_buckets
+        slices = self.slices
+        if not slices or index > slices[-1].index:
+            sketch = SketchSlice(index, self.precision)
+            slices.append(sketch)
+            return sketch
+        for pos in range(len(slices) - 1, -1, -1):
+            sketch = slices[pos]
+            if sketch.index == index:
+                return sketch
+            if sketch.index < index:
+                sketch = SketchSlice(index, self.precision)
+                slices.insert(pos + 1, sketch)
+                return sketch
+        sketch = SketchSlice(index, self.precision)
+        slices.insert(0, sketch)
+        return sketch
+
+    def _add_distinct(self, bucket_index: int, username_reg, password_reg):
+        sketch = self._slice(bucket_index)
+        if self.usernames is None and len(self.slices) > 1:
+            self._rebuild_union()
+        if username_reg is not None:
+            sketch.usernames.insert(*username_reg)
+            if self.usernames is not None:
+                self.usernames.insert(*username_reg)
+        if password_reg is not None:
+            sketch.passwords.insert(*password_reg)
+            if self.passwords is not None:
+                self.passwords.insert(*password_reg)
+
+    def _rebuild_union(self):
+        slices = self.slices
+        if len(slices) < 2:
+            self.usernames = self.passwords = None
+            return
+        self.usernames = HyperLogLog.union((s.usernames for s in slices), self.precision)
+        self.passwords = HyperLogLog.union((s.passwords for s in slices), self.precision)
+
+    def distinct(self):
+        """(usernames, passwords) sketches for the whole horizon, or (None, None)."""
+        if self.usernames is not None:
+            return self.usernames, self.passwords
+        if self.slices:
+            return self.slices[0].usernames, self.slices[0].passwords
+        return None, None
+
+    def add(self, log: dict, failed: bool, success: bool, username_entropy, password_entropy,
+            username_reg=None, password_reg=None):
+        """
+        `*_entropy` are the credentials' entropy_units() and `*_reg` their
+        register_for() positions, or None if unset.
+        """
+        ts = log["timestamp"]
+        bucket = self._bucket(ts)
+        if ts < bucket.first_ts:
+            bucket.first_ts = ts
+        elif ts > bucket.last_ts:
+            bucket.last_ts = ts
+
+        bucket.total += 1
+        self.total += 1
+        if failed:
+            bucket.failed += 1
+            self.failed += 1
+        if success:
+            bucket.success += 1
+            self.success += 1
+        if username_entropy is not None:
+            bucket.username_count += 1
+            bucket.username_entropy_sum += username_entropy
+            self.username_count += 1
+            self.username_entropy_sum += username_entropy
+        if password_entropy is not None:
+            bucket.password_count += 1
+            bucket.password_entropy_sum += password_entropy
+            self.password_count += 1
+            self.password_entropy_sum += password_entropy
+        if username_reg is not None or password_reg is not None:
+            self._add_distinct(bucket.index, username_reg, password_reg)
+
+    def expire(self, watermark: int):
+        """Drop buckets that no longer overlap (watermark - horizon, watermark]."""
+        oldest = (watermark - self.horizon_ms) // self.bucket_ms + 1
+        buckets = self.buckets
+        while buckets and buckets[0].index < oldest:
+            bucket = buckets.pop(0)
+            self.total -= bucket.total
+            self.failed -= bucket.failed
+            self.success -= bucket.success
+            self.username_count -= bucket.username_count
+            self.password_count -= bucket.password_count
+            self.username_entropy_sum -= bucket.username_entropy_sum
+            self.password_entropy_sum -= bucket.password_entropy_sum
+        self._expire_slices(oldest)
+
+    def _expire_slices(self, oldest: int):
+        slices = self.slices
+        if not self.buckets:
+            slices.clear()
+        else:
+            oldest_slice = oldest // self.slice_buckets
+            if not slices or slices[0].index >= oldest_slice:
+                return
+            while slices and slices[0].index < oldest_slice:
+                slices.pop(0)
+        self._rebuild_union()
+
+    def to_state(self) -> list:
+        """Plain lists/bytes for snapshots; running totals are recomputed on load."""
+        return [
+            self.bucket_ms,
+            [[getattr(b, name) for name in BUCKET_FIELDS] for b in self.buckets],
+            [[s.index, s.usernames.to_bytes(), s.passwords.to_bytes()] for s in self.slices],
+        ]
+
+    def load_state(self, state: list) -> bool:
+        """Restore an empty ring; returns False if the bucket layout has changed."""
+        bucket_ms, bucket_rows, slice_rows = state
+        if bucket_ms != self.bucket_ms:
+            return False
+        if any(len(u) and u[0] & 0x7F != self.precision or len(p) and p[0] & 0x7F != self.precision
+               for _, u, p in slice_rows):
+            return False
+        self.buckets = []
+        for row in bucket_rows:
+            bucket = Bucket(row[0], row[4])
+            for name, value in zip(BUCKET_FIELDS, row):
+                setattr(bucket, name, value)
+            self.buckets.append(bucket)
+            self.total += bucket.total
+            self.failed += bucket.failed
+            self.success += bucket.success
+            self.username_count += bucket.username_count
+            self.password_count += bucket.password_count
+            self.username_entropy_sum += bucket.username_entropy_sum
+            self.password_entropy_sum += bucket.password_entropy_sum
+
+        self.slices = []
+        for index, usernames, passwords in slice_rows:
+            sketch = SketchSlice.__new__(SketchSlice)
+            sketch.index = index
+            sketch.usernames = HyperLogLog.from_bytes(usernames)
+            sketch.passwords = HyperLogLog.from_bytes(passwords)
+            self.slices.append(sketch)
+        self._rebuild_union()
+        return True
+
+    def accepts(self, ts: int, watermark: int) -> bool:
+        return ts // self.bucket_ms > (watermark - self.horizon_ms) // self.bucket_ms
+
+    def features(self, suffix: str) -> dict:
+        total = self.total
+        usernames, passwords = self.distinct()
+        if total >= 2:
+            # Buckets are ordered by time, so the extremes are at the ends
+            avg_delay = (self.buckets[-1].last_ts - self.buckets[0].first_ts) / (total - 1)
+        else:
+            avg_delay = 999999.0
+
+        return {
+            f"attempts_from_ip_last_{suffix}": total,
+            f"failed_attempt_ratio_last_{suffix}": self.failed / total if total else 0,
+            f"success_attempts_last_{suffix}": self.success,
+            f"success_ratio_last_{suffix}": self.success / total if total else 0,
+            f"unique_usernames_from_ip_last_{suffix}": usernames.count() if usernames else 0,
+            f"unique_passwords_from_ip_last_{suffix}": passwords.count() if passwords else 0,
+            f"username_entropy_last_{suffix}": mean_entropy(self.username_entropy_sum, self.username_count),
+            f"password_entropy_last_{suffix}": mean_entropy(self.password_entropy_sum, self.password_count),
+            f"avg_delay_ms_between_attempts_last_{suffix}": avg_delay,
+            f"attempts_per_min_last_{suffix}": total / (self.horizon_ms / 60000),
+        }
+
+# ========================== Per-IP History ==========================
+
+class IPHistory:
+    """One HorizonRing per horizon for a single source IP."""
+
+    __slots__ = ("rings", "precision")
+
+    def __init__(self, horizons: Dict[str, int] = HORIZONS, buckets: int = BUCKETS_PER_HORIZON,
+                 precision: int = DEFAULT_PRECISION):
+        self.precision = precision
+        self.rings = {name: HorizonRing(ms, buckets, precision) for name, ms in horizons.items()}
+
+    def add(self, log: dict, watermark: int):
+        eventid = log["eventid"]
+        failed = "failed" in eventid
+        success = "success" in eventid
+        username = log.get("username")
+        password = log.get("password")
+        if username:
+            username_entropy = entropy_units(username)
+            username_reg = register_for(username, self.precision)
+        else:
+            username_entropy = username_reg = None
+        if password:
+            password_entropy = entropy_units(password)
+            password_reg = register_for(password, self.precision)
+        else:
+            password_entropy = password_reg = None
+
+        ts = log["timestamp"]
+        for ring in self.rings.values():
+            if ring.accepts(ts, watermark):
+                ring.add(log, failed, success, username_entropy, password_entropy,
+                         username_reg, password_reg)
+
+    def expire(self, watermark: int):
+        for ring in self.rings.values():
+            ring.expire(watermark)
+
+    def features(self) -> dict:
+        result = {}
+        for name, ring in self.rings.items():
+            result.update(ring.features(name))
+        return result
+
+    def summary(self) -> dict:
+        """Attempt and distinct-credential counts per horizon."""
+        result = {}
+        for name, ring in self.rings.items():
+            usernames, passwords = ring.distinct()
+            result[name] = {
+                "attempts": ring.total,
+                "unique_usernames": usernames.count() if usernames else 0,
+                "unique_passwords": passwords.count() if passwords else 0,
+            }
+        return result
+
+    def to_state(self) -> dict:
+        return {name: ring.to_state() for name, ring in self.rings.items()}
+
+    def load_state(self, state: dict):
+        """
+        Restore rings saved by to_state(). Horizons that are no longer
+        configured, or whose buckets or precision changed, start empty.
+        """
+        for name, ring in self.rings.items():
+            if name in state:
+                ring.load_state(state[name])
+
+    def sketches(self) -> dict:
+        """Serialized distinct-credential sketches per horizon, for merging elsewhere."""
+        result = {}
+        for name, ring in self.rings.items():
+            usernames, passwords = ring.distinct()
+            result[name] = {
+                "usernames": (usernames or HyperLogLog(self.precision)).to_bytes(),
+                "passwords": (passwords or HyperLogLog(self.precision)).to_bytes(),
+            }
+        return result
+
+    def buckets(self) -> int:
+        return sum(len(ring.buckets) for ring in self.rings.values())
+
+    def __bool__(self):
+        return any(ring.buckets for ring in self.rings.values())
@@ -0,0 +1,399 @@
+"""
+Offline replay / backtest of the classifier over archived logs.
+
+    python replay.py logs.json [--rules new_rules.json] [--workers 4]
+                     [--out labels.ndjson] [--report report.json]
+                     [--truth-field label] [--reorder-buffer 10000]
+
+Re-scores a JSON array (like the ETL's data/logs.json) or an NDJSON file
+without going through HTTP, with the same window store, features and rule
+engine as stateful /predict. `--rules` swaps in a different rule table.
+
+Memory stays constant in the file size:
+
+- Input is parsed incrementally, one element at a time.
+- Events pass through a reorder buffer of `--reorder-buffer` events, so
+  they are replayed in event-time order as long as no event is further
+  out of place than that. Events that are further out of place still get
+  scored, as late arrivals, and are counted under "late".
+- Events are partitioned by src_ip with the same consistent hash as
+  shard_router.py. Each worker process owns the window store of its
+  partitions, which gives the same features as one store, since they are
+  all per-IP. The exception is the last bits of the running entropy sums,
+  which depend on when sweeps happen. That is the same as between two
+  service runs, and it can flip a value sitting exactly on a threshold.
+  Batches go through bounded queues.
+- Each worker writes its labels to a part file in replay order. The part
+  files are merged into `--out`.
+- If a worker fails, its error is sent back and the replay stops with it,
+  instead of waiting on a full queue. The part files are removed.
+
+Timestamps may be epoch milliseconds or ISO-8601 strings (Cowrie's
+format). Each output line is {"seq", "index", "timestamp", ip,
+classification, risk_score, attack_type, attack_confidence}. Here "seq"
+is the replay (event-time) position and "index" is the position in the
+input file. Invalid events produce {"seq", "index", "error"}. The report
+has label distributions and, given `--truth-field`, confusion matrices of
+that field against the classification and the attack type.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import sys
+import time
+import traceback
+
+from pydantic import ValidationError
+
+import api2
+from api2 import LogEntry, build_result
+from responses import shape
+from rules import RuleEngine, load_tables
+from shard_router import HashRing
+from window_store import WindowStore
+
+READ_SIZE = 1 << 20
+BATCH_SIZE = 1000
+QUEUE_BATCHES = 8  # per worker; bounds what sits between the reader and a worker
+POLL_SECONDS = 0.5  # how often a blocked reader checks that the workers are alive
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# ========================== Input ==========================
+
+def _iter_json_array(f) -> Iterator:
+    """Yield the elements of a JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buf = f.read(READ_SIZE)
+    pos = buf.index("[") + 1
+    eof = False
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(READ_SIZE), 0
+            eof = not buf
+        if pos >= len(buf):
+            raise ValueError("JSON array is not terminated")
+        if buf[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The element runs past the buffer: keep the tail and read more
+            more = f.read(READ_SIZE)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield value
+        pos = end
+        if pos > READ_SIZE:
+            buf, pos = buf[pos:], 0
+
+def _iter_ndjson(f) -> Iterator:
+    for line in f:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"__error__": f"Invalid JSON: {e}"}
+
+def detect_format(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        while True:
+            c = f.read(1)
+            if not c or not c.isspace():
+                return "json-array" if c == "[" else "ndjson"
+
+def iter_events(path: str, fmt: str) -> Iterator:
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from (_iter_json_array(f) if fmt == "json-array" else _iter_ndjson(f))
+
+def _timestamp_ms(value) -> Optional[int]:
+    """Epoch ms as-is; ISO-8601 strings (naive means UTC) converted to epoch ms."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        # Integer arithmetic: dt.timestamp() * 1000 can land a millisecond low
+        return (dt - EPOCH) // timedelta(milliseconds=1)
+    return None
+
+# ========================== Workers ==========================
+
+def _add_confusion(confusion: dict, truth, predicted):
+    row = confusion.setdefault(str(truth), {})
+    row[predicted] = row.get(predicted, 0) + 1
+
+def _worker(index: int, queue, results, part_path: str, rules_path: Optional[str]):
+    """Run _score and send back its summary, or the error that stopped it."""
+    try:
+        summary = _score(queue, part_path, rules_path)
+    except BaseException:
+        results.put({"worker": index, "error": traceback.format_exc()})
+        return
+    summary["worker"] = index
+    results.put(summary)
+
+def _score(queue, part_path: str, rules_path: Optional[str]) -> dict:
+    """Score this partition's batches of (seq, index, event, truth) in order."""
+    if rules_path:
+        api2.rule_engine = RuleEngine(rules_path, check_interval=float("inf"))
+    store = WindowStore()
+    summary = {
+        "events": 0, "invalid": 0,
+        "classification": Counter(), "attack_type": Counter(),
+        "confusion": {"classification": {}, "attack_type": {}},
+    }
+    with open(part_path, "w", encoding="utf-8") as out:
+        while True:
+            batch = queue.get()
+            if batch is None:
+                break
+            for seq, index, event, truth in batch:
+                summary["events"] += 1
+                error = event.get("__error__")
+                if error is None:
+                    try:
+                        log = LogEntry.model_validate(event).model_dump()
+                    except ValidationError as e:
+                        error = e.errors(include_url=False, include_context=False)
+                if error is not None:
+                    summary["invalid"] += 1
+                    line = {"seq": seq, "index": index, "error": error}
+                    out.write(f"{seq}\t{json.dumps(line, default=str)}\n")
+                    continue
+
+                result = build_result(log, store.add(log))
+                summary["classification"][result["classification"]] += 1
+                summary["attack_type"][result["attack_type"]] += 1
+                if truth is not None:
+                    _add_confusion(summary["confusion"]["classification"], truth, result["classification"])
+                    _add_confusion(summary["confusion"]["attack_type"], truth, result["attack_type"])
+                line = {"seq": seq, "index": index, "timestamp": log["timestamp"], **shape(result, "minimal")}
+                out.write(f"{seq}\t{json.dumps(line)}\n")
+    return summary
+
+# ========================== Replay ==========================
+
+class WorkerError(RuntimeError):
+    pass
+
+def _raise_worker_error(summary: dict):
+    raise WorkerError(f"replay worker {summary['worker']} failed:\n{summary['error']}")
+
+class _Workers:
+    """The worker processes plus the reader's side of their queues."""
+
+    def __init__(self, ctx, workers: int, part_paths: list, rules_path: Optional[str]):
+        self.queues = [ctx.Queue(QUEUE_BATCHES) for _ in range(workers)]
+        self.results = ctx.Queue()
+        self.summaries = {}
+        self.procs = [
+            ctx.Process(target=_worker, args=(i, self.queues[i], self.results, part_paths[i], rules_path),
+                        daemon=True)
+            for i in range(workers)
+        ]
+        for p in self.procs:
+            p.start()
+
+    def _collect(self, timeout: Optional[float] = None):
+        """Take one result if there is one; raise if it is an error."""
+        try:
+            summary = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+        except queue_module.Empty:
+            return
+        if "error" in summary:
+            _raise_worker_error(summary)
+        self.summaries[summary["worker"]] = summary
+
+    def _check_alive(self, shard: int):
+        proc = self.procs[shard]
+        if proc.is_alive() or shard in self.summaries:
+            return
+        # Its error report may still be on its way through the results queue
+        self._collect(POLL_SECONDS)
+        if shard not in self.summaries:
+            raise WorkerError(f"replay worker {shard} exited with code {proc.exitcode} without a result")
+
+    def put(self, shard: int, item):
+        while True:
+            try:
+                self.queues[shard].put(item, timeout=POLL_SECONDS)
+                return
+            except queue_module.Full:
+                self._collect()
+                self._check_alive(shard)
+
+    def wait(self) -> list:
+        while len(self.summaries) < len(self.procs):
+            self._collect(POLL_SECONDS)
+            for shard in range(len(self.procs)):
+                self._check_alive(shard)
+        for p in self.procs:
+            p.join()
+        return [self.summaries[i] for i in range(len(self.procs))]
+
+    def kill(self):
+        for p in self.procs:
+            p.terminate()
+        for p in self.procs:
+            p.join()
+        for q in self.queues:
+            # Don't let exit wait to flush batches nobody will read
+            q.cancel_join_thread()
+
+def _merge_parts(part_paths: list, out_path: str):
+    """k-way merge of the part files, each already in seq order."""
+    files = [open(p, encoding="utf-8") for p in part_paths]
+    try:
+        keyed = [((int(line.split("\t", 1)[0]), line) for line in f) for f in files]
+        with open(out_path, "w", encoding="utf-8") as out:
+            for _, line in heapq.merge(*keyed):
+                out.write(line.split("\t", 1)[1])
+    finally:
+        for f in files:
+            f.close()
+        for p in part_paths:
+            os.unlink(p)
+
+def _merge_confusion(total: dict, part: dict):
+    for truth, row in part.items():
+        target = total.setdefault(truth, {})
+        for predicted, n in row.items():
+            target[predicted] = target.get(predicted, 0) + n
+
+def replay(path: str, out_path: str, workers: int = 1, rules_path: Optional[str] = None,
+           truth_field: Optional[str] = None, reorder_buffer: int = 10000) -> dict:
+    """Replay `path` through the classifier; returns the summary report."""
+    start = time.perf_counter()
+    fmt = detect_format(path)
+    workers = max(1, workers)
+    ring = HashRing(workers)
+    part_paths = [f"{out_path}.part{i}" for i in range(workers)]
+    pool = _Workers(multiprocessing.get_context(), workers, part_paths, rules_path)
+
+    batches = [[] for _ in range(workers)]
+    partitions = [0] * workers
+    late = 0
+    last_ts = None
+    seq = 0
+
+    def emit(item):
+        nonlocal seq, late, last_ts
+        ts, index, event, truth = item
+        if ts >= 0:
+            if last_ts is not None and ts < last_ts:
+                late += 1
+            else:
+                last_ts = ts
+        src_ip = event.get("src_ip")
+        shard = ring.shard_for(src_ip) if isinstance(src_ip, str) else 0
+        batch = batches[shard]
+        batch.append((seq, index, event, truth))
+        partitions[shard] += 1
+        seq += 1
+        if len(batch) >= BATCH_SIZE:
+            pool.put(shard, batch)
+            batches[shard] = []
+
+    try:
+        pending = []  # heap of (timestamp or -1, index, event, truth)
+        for index, event in enumerate(iter_events(path, fmt)):
+            if not isinstance(event, dict):
+                event = {"__error__": "Expected a JSON object"}
+            ts = _timestamp_ms(event.get("timestamp"))
+            if ts is not None:
+                event["timestamp"] = ts
+            truth = event.pop(truth_field, None) if truth_field else None
+            item = (ts if ts is not None else -1, index, event, truth)
+            heapq.heappush(pending, item)
+            if len(pending) > reorder_buffer:
+                emit(heapq.heappop(pending))
+        while pending:
+            emit(heapq.heappop(pending))
+        for shard, batch in enumerate(batches):
+            if batch:
+                pool.put(shard, batch)
+        for shard in range(workers):
+            pool.put(shard, None)
+        summaries = pool.wait()
+        _merge_parts(part_paths, out_path)
+    except BaseException:
+        pool.kill()
+        for p in part_paths:
+            if os.path.exists(p):
+                os.unlink(p)
+        raise
+
+    report = {
+        "input": path,
+        "format": fmt,
+        "output": out_path,
+        "rules": rules_path or api2.rule_engine.path,
+        "workers": workers,
+        "events": sum(s["events"] for s in summaries),
+        "invalid": sum(s["invalid"] for s in summaries),
+        "late": late,
+        "partitions": partitions,
+        "classification": dict(sum((s["classification"] for s in summaries), Counter()).most_common()),
+        "attack_type": dict(sum((s["attack_type"] for s in summaries), Counter()).most_common()),
+    }
+    if truth_field:
+        confusion = {"classification": {}, "attack_type": {}}
+        for s in summaries:
+            for kind in confusion:
+                _merge_confusion(confusion[kind], s["confusion"][kind])
+        report["truth_field"] = truth_field
+        report["confusion"] = confusion
+    seconds = time.perf_counter() - start
+    report["seconds"] = round(seconds, 3)
+    report["events_per_second"] = round(report["events"] / seconds, 1) if seconds else 0.0
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON array or NDJSON file of log events")
+    parser.add_argument("--out", default="replay-labels.ndjson", help="per-event labels (NDJSON)")
+    parser.add_argument("--report", help="also write the summary report here (JSON)")
+    parser.add_argument("--rules", help="rule table to score with (default: the service's)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--truth-field", help="event field holding a ground-truth label")
+    parser.add_argument("--reorder-buffer", type=int, default=10000,
+                        help="events held back to restore event-time order")
+    args = parser.parse_args()
+
+    if args.rules:
+        try:
+            load_tables(args.rules)
+        except (OSError, ValueError, TypeError) as e:
+            sys.exit(f"Could not load rules from {args.rules}: {e}")
+
+    try:
+        report = replay(args.input, args.out, args.workers, args.rules, args.truth_field, args.reorder_buffer)
+    except WorkerError as e:
+        sys.exit(str(e))
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Response profiles and JSON rendering for the /predict endpoints.
+
+Callers pick how much of each result they get back with ?profile=:
+
+    minimal   ip, classification, risk_score, attack_type, attack_confidence
+    standard  minimal + username, password, message (what the log service
+              stores and the dashboard shows)
+    debug     everything, including the full `features` dict and the
+              version of the rule table that produced the label
+
+ML_RESPONSE_PROFILE sets the default (standard). Bodies are serialized with
+orjson when it is installed, which is several times faster than the
+standard library encoder Starlette uses; the output is the same JSON.
+ResponseStats keeps per-profile payload size and serialization time for
+GET /response-stats.
+"""
+from threading import Lock
+from typing import Literal, Optional
+import json
+import os
+import time
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("WARNING: orjson not installed, using the standard JSON encoder. Install with: pip install orjson")
+
+Profile = Literal["minimal", "standard", "debug"]
+PROFILES = ("minimal", "standard", "debug")
+PROFILE_FIELDS = {
+    "minimal": ("ip", "classification", "risk_score", "attack_type", "attack_confidence"),
+    "standard": ("ip", "username", "password", "message",
+                 "classification", "risk_score", "attack_type", "attack_confidence"),
+}
+DEFAULT_PROFILE = os.getenv("ML_RESPONSE_PROFILE", "standard")
+if DEFAULT_PROFILE not in PROFILES:
+    raise ValueError(f"Unknown response profile {DEFAULT_PROFILE!r}, expected one of {PROFILES}")
+
+# ========================== Serialization ==========================
+
+if ORJSON_AVAILABLE:
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+else:
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def shape(result: dict, profile: str) -> dict:
+    """Cut a build_result() dict down to `profile`. Error entries pass through."""
+    fields = PROFILE_FIELDS.get(profile)
+    if fields is None or "classification" not in result:
+        return result
+    return {key: result[key] for key in fields}
+
+# ========================== Stats ==========================
+
+class ResponseStats:
+    """Payload bytes and serialization time per profile."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._totals = {profile: [0, 0, 0.0] for profile in PROFILES}
+
+    def record(self, profile: str, size: int, seconds: float, results: int = 1):
+        with self._lock:
+            totals = self._totals[profile]
+            totals[0] += results
+            totals[1] += size
+            totals[2] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "encoder": "orjson" if ORJSON_AVAILABLE else "json",
+                "default_profile": DEFAULT_PROFILE,
+                "profiles": {
+                    profile: {
+                        "results": results,
+                        "bytes": size,
+                        "avg_bytes": round(size / results, 1) if results else 0.0,
+                        "avg_serialize_us": round(seconds / results * 1e6, 2) if results else 0.0,
+                    }
+                    for profile, (results, size, seconds) in self._totals.items()
+                },
+            }
+
+response_stats = ResponseStats()
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with dumps(). Given a `profile`, the body's size and
+    encoding time are recorded under it (`results` is how many results the
+    body holds, for batches).
+    """
+
+    def __init__(self, content, profile: Optional[str] = None, results: int = 1, **kwargs):
+        self.profile = profile
+        self.results = results
+        super().__init__(content, **kwargs)
+
+    def render(self, content) -> bytes:
+        if self.profile is None:
+            return dumps(content)
+        start = time.perf_counter()
+        body = dumps(content)
+        response_stats.record(self.profile, len(body), time.perf_counter() - start, self.results)
+        return body
@@ -0,0 +1,305 @@
+"""
+Declarative rule engine for classify_attack_basic / classify_attack_type.
+
+Thresholds live in an ordered rule table (rules.json, or ML_RULES_PATH):
+
+    {
+      "basic":       [rule, ...],
+      "attack_type": [rule, ...]
+    }
+
+    rule      = {"name": str, "when": condition, "label": str, "score": float}
+    condition = [operand, op, value]       op: < <= > >= == != contains
+              | {"all": [condition, ...]}
+              | {"any": [condition, ...]}
+
+An operand is a feature name, or "current_log.<field>" for the event being
+classified. Features outside the 1-minute set (the `_last_<horizon>` ones
+from horizons.py) only exist in stateful mode; a clause on a missing
+feature is false. The first matching rule wins, and the last rule must be a
+default with no "when".
+
+Clauses are type-checked at load time, so a table that loads cannot fail
+while classifying. Unknown operands are rejected. Features take finite
+numbers with the comparison operators. Log fields follow LogEntry: the
+string fields take "contains", == and != with strings (a null username or
+password matches nothing), and timestamp takes numbers.
+
+Each table is compiled at load time twice: into a generated Python function
+for single feature dicts, and into NumPy mask expressions for whole batches
+(see columnar.columnar_features). The file is re-read when its mtime
+changes, checked at most every `check_interval` seconds, so thresholds can
+be tuned without restarting uvicorn. A table that fails to load is
+reported and the previous one stays active.
+"""
+from threading import Lock
+from typing import Optional
+import json
+import math
+import operator
+import os
+import time
+
+from columnar import FEATURE_NAMES, NUMPY_AVAILABLE
+from horizons import HORIZON_FEATURES, HORIZONS
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+RULES_PATH = os.getenv("ML_RULES_PATH", os.path.join(os.path.dirname(__file__), "rules.json"))
+TABLES = ("basic", "attack_type")
+
+OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+ORDERING_OPS = ("<", "<=", ">", ">=")
+CURRENT_LOG = "current_log."
+
+# Every feature a rule may name: the 1-minute set plus the stateful horizons
+KNOWN_FEATURES = frozenset(FEATURE_NAMES) | frozenset(
+    f"{base}_last_{horizon}" for base in HORIZON_FEATURES for horizon in HORIZONS
+)
+# current_log fields (see api2.LogEntry); username/password may be null
+LOG_STRING_FIELDS = ("src_ip", "username", "password", "eventid", "message")
+LOG_NUMBER_FIELDS = ("timestamp",)
+LOG_NULLABLE_FIELDS = ("username", "password")
+
+# ========================== Validation ==========================
+
+def _check_condition(cond, where: str):
+    if isinstance(cond, dict):
+        if len(cond) != 1 or next(iter(cond)) not in ("all", "any"):
+            raise ValueError(f"{where}: condition maps must have exactly one key, 'all' or 'any'")
+        children = next(iter(cond.values()))
+        if not isinstance(children, list) or not children:
+            raise ValueError(f"{where}: '{next(iter(cond))}' needs a non-empty list")
+        for i, child in enumerate(children):
+            _check_condition(child, f"{where}[{i}]")
+        return
+
+    if not isinstance(cond, list) or len(cond) != 3:
+        raise ValueError(f"{where}: clauses are [operand, op, value]")
+    operand, op, value = cond
+    if not isinstance(operand, str):
+        raise ValueError(f"{where}: operand must be a string")
+    if not isinstance(op, str) or (op != "contains" and op not in OPS):
+        raise ValueError(f"{where}: unknown operator {op!r}")
+
+    if operand.startswith(CURRENT_LOG):
+        field = operand[len(CURRENT_LOG):]
+        if field in LOG_STRING_FIELDS:
+            if op in ORDERING_OPS:
+                raise ValueError(f"{where}: {operand} is a string; use contains, == or !=")
+            if not isinstance(value, str):
+                raise ValueError(f"{where}: {operand} is compared with a string value")
+            return
+        if field not in LOG_NUMBER_FIELDS:
+            raise ValueError(f"{where}: unknown log field {operand!r}")
+    elif operand not in KNOWN_FEATURES:
+        raise ValueError(f"{where}: unknown feature {operand!r}")
+
+    # Numeric operand: a feature or current_log.timestamp
+    if op == "contains":
+        raise ValueError(f"{where}: 'contains' only applies to string log fields")
+    if not _is_finite_number(value):
+        raise ValueError(f"{where}: {operand} is compared with a finite number")
+
+def _is_finite_number(value) -> bool:
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+def _check_table(name: str, rules) -> list:
+    if not isinstance(rules, list) or not rules:
+        raise ValueError(f"rule table {name!r} must be a non-empty list")
+    for i, rule in enumerate(rules):
+        where = f"{name}[{i}]"
+        if not isinstance(rule, dict) or not isinstance(rule.get("label"), str):
+            raise ValueError(f"{where}: rules need a string 'label'")
+        if not _is_finite_number(rule.get("score")):
+            raise ValueError(f"{where}: rules need a finite numeric 'score'")
+        last = i == len(rules) - 1
+        if last and "when" in rule:
+            raise ValueError(f"{where}: the last rule must be a default without 'when'")
+        if not last:
+            if "when" not in rule:
+                raise ValueError(f"{where}: only the last rule may omit 'when'")
+            _check_condition(rule["when"], where)
+    return rules
+
+# ========================== Compilation ==========================
+
+def _operand_source(operand: str) -> str:
+    if operand.startswith(CURRENT_LOG):
+        return f"current_log[{operand[len(CURRENT_LOG):]!r}]"
+    return f"f[{operand!r}]"
+
+def _condition_source(cond) -> str:
+    if isinstance(cond, dict):
+        joiner = " and " if "all" in cond else " or "
+        return "(" + joiner.join(_condition_source(c) for c in next(iter(cond.values()))) + ")"
+
+    operand, op, value = cond
+    source = _operand_source(operand)
+    if op == "contains":
+        expr = f"({value!r} in {source})"
+    else:
+        expr = f"({source} {op} {value!r})"
+    if operand.startswith(CURRENT_LOG):
+        if operand[len(CURRENT_LOG):] in LOG_NULLABLE_FIELDS:
+            expr = f"({source} is not None and {expr})"
+        # Mirrors the old `if current_log and ...` guard
+        expr = f"(current_log and {expr})"
+    elif operand not in FEATURE_NAMES:
+        expr = f"({operand!r} in f and {expr})"
+    return expr
+
+def _compile_scalar(name: str, rules: list):
+    lines = ["def evaluate(f, current_log=None):"]
+    for rule in rules[:-1]:
+        lines.append(f"    if {_condition_source(rule['when'])}:")
+        lines.append(f"        return {rule['label']!r}, {rule['score']!r}")
+    lines.append(f"    return {rules[-1]['label']!r}, {rules[-1]['score']!r}")
+    namespace = {}
+    exec(compile("\n".join(lines), f"<rules:{name}>", "exec"), namespace)
+    return namespace["evaluate"]
+
+def _compile_mask(cond):
+    """Compile a condition into fn(arrays, current) -> bool array."""
+    if isinstance(cond, dict):
+        parts = [_compile_mask(c) for c in next(iter(cond.values()))]
+        reduce = np.logical_and.reduce if "all" in cond else np.logical_or.reduce
+        return lambda arrays, current: reduce([p(arrays, current) for p in parts])
+
+    operand, op, value = cond
+    if operand.startswith(CURRENT_LOG):
+        field = operand[len(CURRENT_LOG):]
+
+        def mask(arrays, current):
+            n = len(next(iter(arrays.values())))
+            if current is None or field not in current:
+                return np.zeros(n, dtype=bool)
+            column = current[field]
+            if op == "contains":
+                return np.fromiter((v is not None and value in v for v in column), dtype=bool, count=n)
+            if field in LOG_NULLABLE_FIELDS:
+                return np.fromiter((v is not None and OPS[op](v, value) for v in column), dtype=bool, count=n)
+            return OPS[op](np.asarray(column), value)
+        return mask
+
+    def missing(arrays, current):
+        return np.zeros(len(next(iter(arrays.values()))), dtype=bool)
+
+    fn = OPS[op]
+
+    def mask(arrays, current):
+        if operand not in arrays:
+            return missing(arrays, current)
+        return fn(np.asarray(arrays[operand]), value)
+    return mask
+
+class RuleSet:
+    """One compiled, ordered rule table."""
+
+    def __init__(self, name: str, rules: list):
+        self.name = name
+        self.rules = _check_table(name, rules)
+        self.evaluate = _compile_scalar(name, self.rules)
+        self._masks = [_compile_mask(r["when"]) for r in self.rules[:-1]] if NUMPY_AVAILABLE else None
+
+    def evaluate_arrays(self, arrays: dict, current: Optional[dict] = None):
+        """
+        Evaluate every row of a feature batch at once.
+
+        `arrays` maps feature name -> array (one row per entity), `current`
+        maps current_log field -> sequence for the rows. Returns
+        (labels, scores) arrays; each row gets its first matching rule.
+        """
+        if self._masks is None:
+            raise RuntimeError("numpy is required for array evaluation")
+        n = len(next(iter(arrays.values())))
+        default = self.rules[-1]
+        labels = np.full(n, default["label"], dtype=object)
+        scores = np.full(n, float(default["score"]))
+        # Apply in reverse so earlier rules overwrite later ones
+        for rule, mask in zip(reversed(self.rules[:-1]), reversed(self._masks)):
+            hit = mask(arrays, current)
+            labels[hit] = rule["label"]
+            scores[hit] = rule["score"]
+        return labels, scores
+
+# ========================== Engine ==========================
+
+def load_tables(path: str) -> dict:
+    with open(path) as f:
+        table = json.load(f)
+    if not isinstance(table, dict):
+        raise ValueError("rules file must contain a JSON object")
+    missing = [name for name in TABLES if name not in table]
+    if missing:
+        raise ValueError(f"rules file is missing tables: {missing}")
+    return {name: RuleSet(name, table[name]) for name in TABLES}
+
+class RuleEngine:
+    """Holds the active rule tables and hot-reloads them from disk."""
+
+    def __init__(self, path: str = RULES_PATH, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self.last_error = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = Lock()
+        self.tables = None
+        self.reload()
+        if self.tables is None:
+            raise RuntimeError(f"Could not load rules from {path}: {self.last_error}")
+
+    def reload(self) -> bool:
+        """Re-read the rules file. Returns False (keeping old rules) on error."""
+        with self._lock:
+            try:
+                # Remember the mtime even if loading fails, so a broken file
+                # is reported once rather than on every check
+                self._mtime = os.stat(self.path).st_mtime_ns
+                tables = load_tables(self.path)
+            except (OSError, ValueError, TypeError) as e:
+                self.last_error = str(e)
+                print(f"WARNING: Failed to load rules from {self.path}: {e}")
+                return False
+            self.tables = tables
+            self.version += 1
+            self.last_error = None
+            return True
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def classify_basic(self, features: dict, current_log: Optional[dict] = None):
+        self.maybe_reload()
+        return self.tables["basic"].evaluate(features, current_log)
+
+    def classify_attack_type(self, features: dict):
+        self.maybe_reload()
+        return self.tables["attack_type"].evaluate(features)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "last_error": self.last_error,
+            "rules": {name: [r.get("name", r["label"]) for r in rs.rules] for name, rs in self.tables.items()},
+        }
@@ -0,0 +1,337 @@
+"""
+Sharded deployment: a thin router in front of several api2 workers.
+
+`uvicorn api2:app --workers N` breaks stateful classification, because
+the kernel spreads one attacker's events over workers that each see only
+part of the IP's window. Here every src_ip is hashed onto a consistent-hash
+ring, so one worker owns each IP's window state, while classification runs
+on N cores:
+
+    python shard_router.py --workers 4 --port 8000       # spawn 4 workers
+    python shard_router.py --shard-urls http://a:8101 http://b:8101
+
+Adding or removing a worker only moves about 1/N of the IPs. Routed:
+
+    POST /predict         by current_log.src_ip (JSON or msgpack bodies)
+    POST /predict/batch   stateful: split per shard, merged back in input
+                          order; stateless: forwarded whole to one shard
+    GET  /window-stats    summed over shards; fleet distinct counts are
+                          merged from every worker's HyperLogLog sketches
+    GET  /rules, /executor-stats, /cache-stats, /snapshot-stats,
+         /response-stats,
+    POST /rules/reload    fanned out, one result per shard
+
+/predict/stream is not routed; send streams to a worker directly. Spawned
+workers each get their own snapshot file (see snapshot.py).
+"""
+from bisect import bisect_right
+from functools import lru_cache
+from hashlib import blake2b
+from typing import List, Optional
+import argparse
+import asyncio
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+from g2s_auth import verify_g2s_token
+from hll import HyperLogLog
+from snapshot import SNAPSHOT_PATH
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    print("WARNING: httpx not installed, shard router unavailable. Install with: pip install httpx")
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+BINARY_CONTENT_TYPE = "application/x-msgpack"
+VNODES = 128
+SHARD_URLS = [u for u in os.getenv("ML_SHARD_URLS", "").split(",") if u]
+FANOUT_GET = ("/rules", "/executor-stats", "/cache-stats", "/snapshot-stats", "/response-stats")
+SUMMED_STATS = (
+    "tracked_ips", "events", "history_buckets", "evictions", "expirations", "future_events", "approx_bytes",
+)
+
+# ========================== Consistent Hashing ==========================
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """
+    Consistent-hash ring over `n` shards with `vnodes` points each.
+
+    Stable across processes and restarts (BLAKE2b, not hash()), so an IP
+    keeps its shard as long as the shard count does.
+    """
+
+    def __init__(self, n: int, vnodes: int = VNODES):
+        if n < 1:
+            raise ValueError("a hash ring needs at least one shard")
+        points = sorted((_hash(f"shard-{shard}#{v}"), shard) for shard in range(n) for v in range(vnodes))
+        self.n = n
+        self._keys = [p for p, _ in points]
+        self._shards = [s for _, s in points]
+        self.shard_for = lru_cache(maxsize=65536)(self._lookup)
+
+    def _lookup(self, key: str) -> int:
+        i = bisect_right(self._keys, _hash(key))
+        return self._shards[i % len(self._shards)]
+
+# ========================== Router ==========================
+
+class ShardRouter:
+    """Forwards requests to the worker owning each src_ip."""
+
+    def __init__(self, urls: List[str], vnodes: int = VNODES):
+        self.urls = [u.rstrip("/") for u in urls]
+        self.ring = HashRing(len(self.urls), vnodes)
+        self.routed = [0] * len(self.urls)
+        self.client = httpx.AsyncClient(
+            timeout=60.0, limits=httpx.Limits(max_connections=64 * len(self.urls))
+        )
+
+    async def send(self, shard: int, method: str, path: str, body: bytes = b"",
+                   headers: Optional[dict] = None, params=None):
+        self.routed[shard] += 1
+        return await self.client.request(
+            method, self.urls[shard] + path, content=body, headers=headers, params=params
+        )
+
+    async def fan_out(self, method: str, path: str, headers: dict, params=None):
+        return await asyncio.gather(*(
+            self.send(shard, method, path, headers=headers, params=params)
+            for shard in range(len(self.urls))
+        ))
+
+    async def close(self):
+        await self.client.aclose()
+
+def _passthrough(r) -> Response:
+    return Response(content=r.content, status_code=r.status_code,
+                    media_type=r.headers.get("content-type"))
+
+def _forward_headers(request: Request) -> dict:
+    headers = {"content-type": request.headers.get("content-type", "application/json")}
+    if "authorization" in request.headers:
+        headers["authorization"] = request.headers["authorization"]
+    return headers
+
+def _src_ip(body: bytes, content_type: str) -> Optional[str]:
+    """Pull current_log.src_ip out of a /predict body; None if malformed."""
+    try:
+        if content_type == BINARY_CONTENT_TYPE and MSGPACK_AVAILABLE:
+            payload = msgpack.unpackb(body, raw=False)
+        else:
+            payload = json.loads(body)
+        src_ip = payload["current_log"]["src_ip"]
+    except (ValueError, KeyError, TypeError):  # msgpack's errors are ValueErrors
+        return None
+    return src_ip if isinstance(src_ip, str) else None
+
+router_app = FastAPI(title="Adaptive Honeypot Log Classifier (shard router)", version="3.0")
+router: Optional[ShardRouter] = None
+
+@router_app.on_event("startup")
+def start_router():
+    global router
+    if router is None:
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("The shard router needs httpx")
+        if not SHARD_URLS:
+            raise RuntimeError("Set ML_SHARD_URLS or start through `python shard_router.py`")
+        router = ShardRouter(SHARD_URLS)
+
+@router_app.on_event("shutdown")
+async def stop_router():
+    if router is not None:
+        await router.close()
+
+@router_app.post("/predict")
+async def route_predict(request: Request):
+    body = await request.body()
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    src_ip = _src_ip(body, content_type)
+    # Malformed bodies go to shard 0, which produces the usual 400/422
+    shard = 0 if src_ip is None else router.ring.shard_for(src_ip)
+    r = await router.send(shard, "POST", "/predict", body, _forward_headers(request), request.query_params)
+    return _passthrough(r)
+
+@router_app.post("/predict/batch")
+async def route_batch(request: Request):
+    body = await request.body()
+    headers = _forward_headers(request)
+    params = request.query_params
+    try:
+        payload = json.loads(body)
+        logs = payload["current_logs"]
+        shards = [router.ring.shard_for(log["src_ip"]) for log in logs]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return _passthrough(await router.send(0, "POST", "/predict/batch", body, headers, params))
+
+    if payload.get("recent_logs") is not None or not logs:
+        # Stateless: the window travels with the request, any shard will do
+        return _passthrough(await router.send(shards[0] if shards else 0, "POST", "/predict/batch", body, headers, params))
+
+    # Stateful: each shard gets its own logs, in input order
+    positions = {}
+    for i, shard in enumerate(shards):
+        positions.setdefault(shard, []).append(i)
+    order = list(positions)
+    responses = await asyncio.gather(*(
+        router.send(shard, "POST", "/predict/batch",
+                    json.dumps({"current_logs": [logs[i] for i in positions[shard]]}).encode(), headers, params)
+        for shard in order
+    ))
+    for r in responses:
+        if r.status_code != 200:
+            return _passthrough(r)
+
+    results = [None] * len(logs)
+    for shard, r in zip(order, responses):
+        for i, result in zip(positions[shard], r.json()["results"]):
+            results[i] = result
+    return {"results": results, "count": len(results)}
+
+@router_app.post("/predict/stream")
+async def route_stream():
+    raise HTTPException(status_code=501, detail="Send /predict/stream to a worker directly in sharded mode")
+
+@router_app.get("/window-stats")
+async def route_window_stats(request: Request):
+    responses = await router.fan_out("GET", "/window-stats", _forward_headers(request), {"sketches": "true"})
+    for r in responses:
+        if r.status_code != 200:
+            return _passthrough(r)
+
+    shards = [r.json() for r in responses]
+    merged = {name: sum(s.get(name, 0) for s in shards) for name in SUMMED_STATS}
+
+    # Distinct counts do not add up across shards; merge the sketches instead
+    fleet = {}
+    for horizon in shards[0].get("fleet_sketches", {}):
+        fleet[horizon] = {"attempts": sum(s["fleet"][horizon]["attempts"] for s in shards)}
+        for name in ("usernames", "passwords"):
+            sketches = [HyperLogLog.from_bytes(base64.b64decode(s["fleet_sketches"][horizon][name]))
+                        for s in shards]
+            fleet[horizon][f"unique_{name}"] = HyperLogLog.union(sketches, sketches[0].p).count()
+    for s in shards:
+        s.pop("fleet_sketches", None)
+
+    return {**merged, "fleet": fleet, "shards": shards}
+
+async def _fan_out_results(request: Request, method: str, path: str):
+    responses = await router.fan_out(method, path, _forward_headers(request))
+    for r in responses:
+        if r.status_code != 200:
+            return _passthrough(r)
+    return {"shards": [r.json() for r in responses]}
+
+def _fan_out_route(path: str):
+    async def endpoint(request: Request):
+        return await _fan_out_results(request, "GET", path)
+    endpoint.__name__ = "route" + path.replace("/", "_").replace("-", "_")
+    return endpoint
+
+for _path in FANOUT_GET:
+    router_app.add_api_route(_path, _fan_out_route(_path), methods=["GET"])
+
+@router_app.post("/rules/reload")
+async def route_rules_reload(request: Request):
+    return await _fan_out_results(request, "POST", "/rules/reload")
+
+@router_app.get("/shard-stats")
+def shard_stats(g2s=Depends(verify_g2s_token)):
+    """Requests routed to each worker."""
+    return {
+        "shards": [{"url": url, "routed": n} for url, n in zip(router.urls, router.routed)],
+        "vnodes": len(router.ring._keys) // router.ring.n,
+        "ring_cache": router.ring.shard_for.cache_info()._asdict(),
+    }
+
+@router_app.get("/")
+def root():
+    return {"message": "ML shard router running", "shards": len(router.urls) if router else 0}
+
+# ========================== Worker Processes ==========================
+
+def _worker_env(index: int) -> dict:
+    """Give every worker its own snapshot file."""
+    env = dict(os.environ)
+    if SNAPSHOT_PATH:
+        root, ext = os.path.splitext(SNAPSHOT_PATH)
+        env["ML_SNAPSHOT_PATH"] = f"{root}.shard{index}{ext}"
+    return env
+
+def spawn_workers(n: int, host: str, base_port: int) -> List[subprocess.Popen]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api2:app", "--host", host,
+             "--port", str(base_port + i), "--log-level", "warning"],
+            cwd=here, env=_worker_env(i),
+        )
+        for i in range(n)
+    ]
+
+def wait_ready(urls: List[str], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        while True:
+            try:
+                if httpx.get(url + "/", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Worker {url} did not start")
+            time.sleep(0.1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-urls", nargs="+", help="use running workers instead of spawning")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--worker-host", default="127.0.0.1")
+    parser.add_argument("--worker-port-base", type=int, default=8100)
+    parser.add_argument("--vnodes", type=int, default=VNODES)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    global router
+    workers = []
+    urls = args.shard_urls or SHARD_URLS
+    if not urls:
+        workers = spawn_workers(args.workers, args.worker_host, args.worker_port_base)
+        urls = [f"http://{args.worker_host}:{args.worker_port_base + i}" for i in range(args.workers)]
+    # uvicorn re-raises SIGTERM once it has shut down; turn it into an exit
+    # so the finally block below still stops the workers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        wait_ready(urls)
+        router = ShardRouter(urls, args.vnodes)
+        uvicorn.run(router_app, host=args.host, port=args.port, log_level="warning")
+    finally:
+        for w in workers:
+            w.terminate()  # SIGTERM lets each worker write its final snapshot
+        for w in workers:
+            w.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Periodic on-disk snapshots of the window store, restored on startup.
+
+Without them every attacker looks new for a full window after a restart,
+which is exactly when deploys under attack happen. The file is a stream of
+msgpack objects:
+
+    b"MLWS" version-byte
+    header   {"watermark", "window_ms", "fleet", "created"}
+    entry    [src_ip, last_seen, [[ts, username, password, eventid], ...], history]
+    ...
+
+Entries are written in least-recently-seen order and read back one at a
+time with a streaming Unpacker, so restoring never holds the whole file in
+memory. Writes go to a temporary file that is fsynced and then renamed
+over the old snapshot, so a crash mid-write leaves the previous one intact.
+
+Configure with ML_SNAPSHOT_PATH (empty disables snapshots) and
+ML_SNAPSHOT_INTERVAL in seconds (0 only snapshots on shutdown).
+"""
+from threading import Event, Lock, Thread
+from typing import Optional
+import os
+import time
+
+from window_store import WindowStore
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    print("WARNING: msgpack not installed, window snapshots disabled. Install with: pip install msgpack")
+
+SNAPSHOT_PATH = os.getenv(
+    "ML_SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "state", "window_store.snapshot")
+)
+SNAPSHOT_INTERVAL = float(os.getenv("ML_SNAPSHOT_INTERVAL", "60"))
+MAGIC = b"MLWS"
+VERSION = 2  # 2: horizon entropy sums are fixed-point ints
+READ_SIZE = 1 << 20
+
+# ========================== File Format ==========================
+
+def save_snapshot(store: WindowStore, path: str) -> dict:
+    """Atomically write `store` to `path` and return what it cost."""
+    start = time.perf_counter()
+    lock_seconds = max_lock_seconds = 0.0
+    entries = 0
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    packer = msgpack.Packer(use_bin_type=True)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + bytes((VERSION,)))
+            f.write(packer.pack({**store.snapshot_header(), "created": time.time()}))
+            chunks = store.export_chunks()
+            while True:
+                # Time spent in next() is time the store lock was held
+                t = time.perf_counter()
+                chunk = next(chunks, None)
+                held = time.perf_counter() - t
+                if chunk is None:
+                    break
+                lock_seconds += held
+                max_lock_seconds = max(max_lock_seconds, held)
+                for state in chunk:
+                    f.write(packer.pack(state))
+                entries += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    return {
+        "at": time.time(),
+        "entries": entries,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 4),
+        "lock_seconds": round(lock_seconds, 4),
+        "max_lock_ms": round(max_lock_seconds * 1000, 3),
+    }
+
+def load_snapshot(store: WindowStore, path: str) -> dict:
+    """Stream a snapshot from `path` into `store`, dropping expired entries."""
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        preamble = f.read(len(MAGIC) + 1)
+        if preamble[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a window store snapshot")
+        if preamble[len(MAGIC):] != bytes((VERSION,)):
+            raise ValueError(f"{path} has an unsupported snapshot version")
+        unpacker = msgpack.Unpacker(f, raw=False, read_size=READ_SIZE, strict_map_key=False)
+        header = next(unpacker, None)
+        if not isinstance(header, dict):
+            raise ValueError(f"{path} has no snapshot header")
+        if header.get("window_ms") != store.window_ms:
+            raise ValueError(f"snapshot window_ms {header.get('window_ms')} != {store.window_ms}")
+        result = store.restore(header, unpacker)
+
+    result.update({
+        "at": time.time(),
+        "snapshot_age_seconds": round(time.time() - header["created"], 1),
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 4),
+    })
+    return result
+
+# ========================== Scheduler ==========================
+
+class SnapshotScheduler:
+    """Restores the store on start, then snapshots it every `interval` seconds."""
+
+    def __init__(self, store: WindowStore, path: str = SNAPSHOT_PATH, interval: float = SNAPSHOT_INTERVAL):
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self.enabled = bool(path) and MSGPACK_AVAILABLE
+        self.saves = 0
+        self.failures = 0
+        self.last_save: Optional[dict] = None
+        self.last_restore: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        # Serializes periodic and shutdown snapshots
+        self._save_lock = Lock()
+
+    def restore(self):
+        if not self.enabled or not os.path.exists(self.path):
+            return
+        try:
+            self.last_restore = load_snapshot(self.store, self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # A bad snapshot must not stop the service; start cold instead
+            self.last_error = f"restore failed: {e}"
+            print(f"WARNING: Could not restore window snapshot {self.path}: {e}")
+            self.store.clear()
+
+    def save(self):
+        if not self.enabled:
+            return
+        with self._save_lock:
+            try:
+                self.last_save = save_snapshot(self.store, self.path)
+                self.saves += 1
+            except Exception as e:
+                # Anything (disk, or a value msgpack cannot encode) must not
+                # kill the timer thread, or snapshots would silently stop
+                self.failures += 1
+                self.last_error = f"save failed: {e!r}"
+                print(f"WARNING: Could not write window snapshot {self.path}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def start(self):
+        self._stop.clear()
+        self.restore()
+        if self.enabled and self.interval > 0:
+            self._thread = Thread(target=self._run, name="window-snapshots", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the timer and take a final snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.save()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "interval_seconds": self.interval,
+            "saves": self.saves,
+            "failures": self.failures,
+            "last_save": self.last_save,
+            "last_restore": self.last_restore,
+            "last_error": self.last_error,
+        }
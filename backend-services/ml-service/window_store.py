@@ -0,0 +1,372 @@
+"""
+Server-side sliding windows of recent events, keyed by source IP.
+
+Lets /predict work from the current log alone: the service remembers the
+last WINDOW_MS of event time per IP instead of receiving it in every request.
+Each window carries a FeatureAccumulator, so features are read off in O(1)
+rather than rebuilt from the raw events. Longer horizons (10 min to 24 h)
+are kept as bucketed counters per IP (horizons.py), not as raw events.
+
+The number of tracked IPs is capped (ML_MAX_TRACKED_IPS, least recently
+seen evicted first), and IPs idle for ML_IP_IDLE_TTL_MS of event time are
+dropped.
+
+Events stamped more than ML_MAX_CLOCK_SKEW_MS (default 5 min; 0 disables
+the check) ahead of the wall clock are classified but neither stored nor
+allowed to move the watermark. Otherwise one event from a host with a bad
+clock would expire every window and make all later events look late.
+"""
+from bisect import insort
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Iterable, Iterator, List
+import os
+import sys
+import time
+
+from features import FeatureAccumulator
+from horizons import HORIZONS, IPHistory
+
+WINDOW_MS = 60 * 1000  # matches the ETL consumer's 1-minute buffer
+SWEEP_EVERY = 1000     # inserts between full sweeps of idle IPs
+FLEET_HORIZONS = {"24h": HORIZONS["24h"]}
+
+# Caps on per-IP state, so address-rotating scanners cannot exhaust memory
+MAX_TRACKED_IPS = int(os.getenv("ML_MAX_TRACKED_IPS", "100000"))
+IP_IDLE_TTL_MS = int(os.getenv("ML_IP_IDLE_TTL_MS", str(HORIZONS["24h"])))
+MAX_CLOCK_SKEW_MS = int(os.getenv("ML_MAX_CLOCK_SKEW_MS", str(5 * 60 * 1000)))
+SIZE_SAMPLE = 256  # entries measured for approx_bytes
+
+# ========================== Per-IP Window ==========================
+
+class IPWindow:
+    """Events from one source IP, kept sorted by timestamp."""
+
+    __slots__ = ("events", "acc")
+
+    def __init__(self):
+        self.events = deque()
+        self.acc = FeatureAccumulator()
+
+    def add(self, log: dict):
+        self.acc.add(log)
+        events = self.events
+        if not events or log["timestamp"] >= events[-1]["timestamp"]:
+            events.append(log)
+        else:
+            # Out-of-order arrival: rare, so an O(n) insert is fine
+            insort(events, log, key=lambda e: e["timestamp"])
+
+    def expire(self, cutoff: int) -> List[dict]:
+        """Drop events with timestamp <= cutoff and return them."""
+        events = self.events
+        expired = []
+        while events and events[0]["timestamp"] <= cutoff:
+            log = events.popleft()
+            self.acc.remove(log)
+            expired.append(log)
+        return expired
+
+    def features(self) -> dict:
+        events = self.events
+        if not events:
+            return self.acc.features()
+        return self.acc.features(events[0]["timestamp"], events[-1]["timestamp"])
+
+    def __len__(self):
+        return len(self.events)
+
+class IPState:
+    """Everything the store keeps for one source IP."""
+
+    __slots__ = ("window", "history", "last_seen")
+
+    def __init__(self, ts: int):
+        self.window = IPWindow()
+        self.history = IPHistory()
+        self.last_seen = ts
+
+    def expire(self, cutoff: int, watermark: int):
+        self.window.expire(cutoff)
+        self.history.expire(watermark)
+
+    def __bool__(self):
+        return bool(self.window) or bool(self.history)
+
+    def to_state(self, src_ip: str) -> list:
+        """Plain lists for snapshots; the accumulator is rebuilt from the events."""
+        events = [[e["timestamp"], e.get("username"), e.get("password"), e["eventid"]]
+                  for e in self.window.events]
+        return [src_ip, self.last_seen, events, self.history.to_state()]
+
+    @classmethod
+    def from_state(cls, state: list) -> "IPState":
+        src_ip, last_seen, events, history = state
+        entry = cls(last_seen)
+        for ts, username, password, eventid in events:
+            entry.window.add({
+                "timestamp": ts, "src_ip": src_ip,
+                "username": username, "password": password, "eventid": eventid,
+            })
+        entry.history.load_state(history)
+        return entry
+
+# ========================== Window Store ==========================
+
+def _deep_sizeof(obj, seen: set) -> int:
+    """Rough recursive size of an entry; strings shared between entries count once."""
+    if id(obj) in seen or (type(obj) is int and -5 <= obj <= 256):  # cached small ints
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, deque, set)):
+        size += sum(_deep_sizeof(v, seen) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(_deep_sizeof(getattr(obj, name), seen)
+                    for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+class WindowStore:
+    """
+    Event-time sliding windows for every active source IP.
+
+    The watermark is the newest timestamp seen across all IPs; anything at or
+    before `watermark - window_ms` is expired. IPs are expired lazily when
+    touched, plus a full sweep every `sweep_every` inserts (or one per
+    tracked IP, if more, keeping sweeps O(1) amortized) so idle IPs do
+    not accumulate. Each IP also has an IPHistory, which outlives the
+    1-minute window and adds the `_last_<horizon>` features.
+
+    Entries are kept in least-recently-seen order. Beyond `max_ips`, the
+    oldest entry is evicted; entries whose newest event is more than `ttl_ms`
+    behind the watermark are expired from the same end. Public methods
+    are serialized by a lock so the store can be used from executor threads.
+    """
+
+    def __init__(self, window_ms: int = WINDOW_MS, sweep_every: int = SWEEP_EVERY,
+                 max_ips: int = MAX_TRACKED_IPS, ttl_ms: int = IP_IDLE_TTL_MS,
+                 max_skew_ms: int = MAX_CLOCK_SKEW_MS, clock=time.time):
+        self.window_ms = window_ms
+        self.sweep_every = sweep_every
+        self.max_ips = max_ips
+        self.ttl_ms = ttl_ms
+        self.max_skew_ms = max_skew_ms
+        self.clock = clock
+        self.watermark = None
+        self._entries: "OrderedDict[str, IPState]" = OrderedDict()
+        # Every IP at once, for fleet-wide distinct credential counts
+        self._fleet = IPHistory(FLEET_HORIZONS)
+        self._inserts = 0
+        self._next_sweep = sweep_every
+        self._evictions = 0
+        self._expirations = 0
+        self._future = 0
+        self._lock = Lock()
+
+    def _cutoff(self) -> int:
+        return self.watermark - self.window_ms
+
+    def _entry(self, src_ip: str, ts: int) -> IPState:
+        entries = self._entries
+        entry = entries.get(src_ip)
+        if entry is None:
+            entry = entries[src_ip] = IPState(ts)
+            while len(entries) > self.max_ips:
+                entries.popitem(last=False)
+                self._evictions += 1
+        else:
+            entries.move_to_end(src_ip)
+            if ts > entry.last_seen:
+                entry.last_seen = ts
+        return entry
+
+    def _expire_idle(self):
+        """Drop idle entries from the least recently seen end."""
+        entries = self._entries
+        idle_before = self.watermark - self.ttl_ms
+        while entries:
+            src_ip, entry = next(iter(entries.items()))
+            if entry.last_seen > idle_before:
+                break
+            del entries[src_ip]
+            self._expirations += 1
+
+    def add(self, log: dict) -> dict:
+        """
+        Record an event and return the features of its source IP's window.
+
+        Late events (already outside the window) are not stored; they are
+        classified against whatever is still in the window. So are events
+        from too far in the future (beyond the wall clock plus max_skew_ms),
+        which also leave the watermark alone.
+        """
+        with self._lock:
+            ts = log["timestamp"]
+            if self.max_skew_ms > 0 and ts > self.clock() * 1000 + self.max_skew_ms:
+                self._future += 1
+                entry = self._entries.get(log["src_ip"]) or IPState(ts)
+                features = entry.window.features()
+                features.update(entry.history.features())
+                return features
+
+            if self.watermark is None or ts > self.watermark:
+                self.watermark = ts
+
+            src_ip = log["src_ip"]
+            entry = self._entry(src_ip, ts)
+            window, history = entry.window, entry.history
+
+            cutoff = self._cutoff()
+            if ts > cutoff:
+                window.add(log)
+            history.add(log, self.watermark)
+            entry.expire(cutoff, self.watermark)
+            self._fleet.add(log, self.watermark)
+            self._fleet.expire(self.watermark)
+
+            self._inserts += 1
+            if self._inserts >= self._next_sweep:
+                self._sweep()
+                self._next_sweep = self._inserts + max(self.sweep_every, len(self._entries))
+            else:
+                self._expire_idle()
+
+            features = window.features()
+            features.update(history.features())
+            if not entry:
+                self._entries.pop(src_ip, None)
+            return features
+
+    def window(self, src_ip: str) -> List[dict]:
+        """Return the current window for an IP without recording anything."""
+        with self._lock:
+            entry = self._entries.get(src_ip)
+            if entry is None or self.watermark is None:
+                return []
+            entry.window.expire(self._cutoff())
+            return list(entry.window.events)
+
+    def sweep(self):
+        """Expire every IP and forget the ones with no state left."""
+        with self._lock:
+            self._sweep()
+
+    def _sweep(self):
+        if self.watermark is None:
+            return
+        self._expire_idle()
+        cutoff = self._cutoff()
+        for src_ip in list(self._entries):
+            entry = self._entries[src_ip]
+            entry.expire(cutoff, self.watermark)
+            if not entry:
+                del self._entries[src_ip]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fleet = IPHistory(FLEET_HORIZONS)
+            self.watermark = None
+            self._inserts = 0
+            self._next_sweep = self.sweep_every
+            self._evictions = 0
+            self._expirations = 0
+            self._future = 0
+
+    def fleet_sketches(self) -> dict:
+        with self._lock:
+            return self._fleet.sketches()
+
+    # ---------------------- Snapshots (see snapshot.py) ----------------------
+
+    def snapshot_header(self) -> dict:
+        with self._lock:
+            return {
+                "watermark": self.watermark,
+                "window_ms": self.window_ms,
+                "fleet": self._fleet.to_state(),
+            }
+
+    def export_chunks(self, chunk_size: int = 256) -> Iterator[list]:
+        """
+        Yield entry states in least-recently-seen order, `chunk_size` at a
+        time. The lock is only held while a chunk is copied, so classification
+        continues during a snapshot; each entry is consistent on its own.
+        """
+        with self._lock:
+            keys = list(self._entries)
+        for start in range(0, len(keys), chunk_size):
+            with self._lock:
+                entries = self._entries
+                chunk = [entries[ip].to_state(ip) for ip in keys[start:start + chunk_size] if ip in entries]
+            yield chunk
+
+    def restore(self, header: dict, states: Iterable[list]) -> dict:
+        """
+        Replace the store's contents with a snapshot. Entries and events
+        already expired at the snapshot's watermark are dropped; the rest
+        expire as usual once new events move the watermark on.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._fleet = IPHistory(FLEET_HORIZONS)
+            self.watermark = header["watermark"]
+            restored = dropped = 0
+            if self.watermark is None:
+                return {"restored": 0, "dropped": 0}
+
+            self._fleet.load_state(header["fleet"])
+            self._fleet.expire(self.watermark)
+            cutoff = self._cutoff()
+            idle_before = self.watermark - self.ttl_ms
+            entries = self._entries
+            for state in states:
+                if state[1] <= idle_before:
+                    dropped += 1
+                    continue
+                entry = IPState.from_state(state)
+                entry.expire(cutoff, self.watermark)
+                if not entry:
+                    dropped += 1
+                    continue
+                entries[state[0]] = entry
+                restored += 1
+                if len(entries) > self.max_ips:
+                    entries.popitem(last=False)
+                    restored -= 1
+                    dropped += 1
+            return {"restored": restored, "dropped": dropped}
+
+    def _approx_bytes(self) -> int:
+        """Estimate table memory from a sample of entries."""
+        entries = self._entries
+        if not entries:
+            return sys.getsizeof(entries)
+        step = max(1, len(entries) // SIZE_SAMPLE)
+        sample = [entry for i, entry in enumerate(entries.values()) if i % step == 0][:SIZE_SAMPLE]
+        seen = set()
+        per_entry = sum(_deep_sizeof(entry, seen) for entry in sample) / len(sample)
+        # Plus the table slot and the IP string key
+        per_entry += sys.getsizeof(next(iter(entries))) + 100
+        return int(sys.getsizeof(entries) + per_entry * len(entries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._entries.values()
+            return {
+                "tracked_ips": len(self._entries),
+                "max_tracked_ips": self.max_ips,
+                "events": sum(len(e.window) for e in entries),
+                "history_buckets": sum(e.history.buckets() for e in entries),
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "future_events": self._future,
+                "approx_bytes": self._approx_bytes(),
+                "fleet": self._fleet.summary(),
+                "watermark": self.watermark,
+                "window_ms": self.window_ms,
+                "ttl_ms": self.ttl_ms,
+                "max_clock_skew_ms": self.max_skew_ms,
+            }
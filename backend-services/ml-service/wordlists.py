@@ -0,0 +1,187 @@
+"""
+Known attack-dictionary credentials, held in a Bloom filter.
+
+Every `*.txt` file under ML_WORDLIST_DIR (default ml-service/wordlists/,
+searched recursively) is read at import, one username or password per line,
+and inserted into a single Bloom filter sized for the total line count and
+ML_WORDLIST_ERROR (default 0.01 false positives). That is about 1.2 bytes
+per entry whatever the entry length, so a 10M-line list such as rockyou
+takes ~12 MB (~7.5 MB at 0.05). Lookups are k hash probes into the bit
+array and are memoized like entropies, since the same credentials come back
+constantly. There are no false negatives.
+
+Lines are matched byte-for-byte after stripping the line ending; no case
+folding or trimming. Files are hashed as raw bytes, so any encoding works
+as long as it matches what the honeypot reports (normally UTF-8).
+"""
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Iterable, List, Optional
+import math
+import os
+import time
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+WORDLIST_DIR = os.getenv("ML_WORDLIST_DIR", os.path.join(os.path.dirname(__file__), "wordlists"))
+WORDLIST_ERROR = float(os.getenv("ML_WORDLIST_ERROR", "0.01"))
+# Lookups are memoized with the same budget as credential entropies
+LOOKUP_CACHE_SIZE = int(os.getenv("ENTROPY_CACHE_SIZE", "65536"))
+MASK64 = (1 << 64) - 1
+CHUNK_LINES = 1 << 16  # lines hashed per vectorized insert
+
+# ========================== Bloom Filter ==========================
+
+class BloomFilter:
+    """
+    Fixed-size set membership with false positives at about `error`.
+
+    Positions are derived by double hashing one 128-bit BLAKE2b digest:
+    probe i is (h1 + i * h2) mod 2**64 mod m, so the scalar and NumPy
+    insert paths set exactly the same bits.
+    """
+
+    __slots__ = ("m", "k", "bits", "count")
+
+    def __init__(self, capacity: int, error: float = WORDLIST_ERROR):
+        if not 0 < error < 1:
+            raise ValueError("Bloom filter error rate must be between 0 and 1")
+        capacity = max(capacity, 1)
+        m = math.ceil(-capacity * math.log(error) / math.log(2) ** 2)
+        self.m = max(64, (m + 7) // 8 * 8)
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray(self.m // 8)
+        self.count = 0
+
+    def _hashes(self, data: bytes):
+        digest = blake2b(data, digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, data: bytes):
+        h1, h2 = self._hashes(data)
+        m, bits = self.m, self.bits
+        for i in range(self.k):
+            pos = ((h1 + i * h2) & MASK64) % m
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def add_many(self, items: List[bytes]):
+        """Insert a chunk of items; vectorized when NumPy is available."""
+        if not NUMPY_AVAILABLE:
+            for item in items:
+                self.add(item)
+            return
+        digests = b"".join(blake2b(item, digest_size=16).digest() for item in items)
+        h = np.frombuffer(digests, dtype="<u8").reshape(-1, 2)
+        h1, h2 = h[:, 0].astype(np.uint64), h[:, 1] | np.uint64(1)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        m = np.uint64(self.m)
+        for i in range(self.k):
+            pos = (h1 + np.uint64(i) * h2) % m  # uint64 arithmetic wraps like MASK64
+            np.bitwise_or.at(bits, (pos >> np.uint64(3)).astype(np.intp),
+                             np.left_shift(1, (pos & np.uint64(7)).astype(np.uint8)).astype(np.uint8))
+        self.count += len(items)
+
+    def __contains__(self, data: bytes) -> bool:
+        h1, h2 = self._hashes(data)
+        m, bits = self.m, self.bits
+        for i in range(self.k):
+            pos = ((h1 + i * h2) & MASK64) % m
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def error_rate(self) -> float:
+        """Expected false-positive rate at the current fill."""
+        return (1 - math.exp(-self.k * self.count / self.m)) ** self.k
+
+# ========================== Wordlist Index ==========================
+
+def _wordlist_files(directory: str) -> List[str]:
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names if name.endswith(".txt")
+    )
+
+def _count_lines(path: str) -> int:
+    lines = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+    return lines + 1  # a last line without a newline
+
+def _read_lines(path: str) -> Iterable[bytes]:
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\r\n")
+            if line:
+                yield line
+
+class WordlistIndex:
+    """Membership of usernames/passwords in the loaded attack dictionaries."""
+
+    def __init__(self, paths: List[str], error: float = WORDLIST_ERROR):
+        self.paths = paths
+        self.filter: Optional[BloomFilter] = None
+        self.entries = 0
+        self.seconds = 0.0
+        if paths:
+            self._load(error)
+        self.contains = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._contains)
+
+    def _load(self, error: float):
+        start = time.perf_counter()
+        bloom = BloomFilter(sum(_count_lines(p) for p in self.paths), error)
+        chunk = []
+        for path in self.paths:
+            for line in _read_lines(path):
+                chunk.append(line)
+                if len(chunk) >= CHUNK_LINES:
+                    bloom.add_many(chunk)
+                    chunk = []
+        if chunk:
+            bloom.add_many(chunk)
+        self.filter = bloom
+        self.entries = bloom.count
+        self.seconds = time.perf_counter() - start
+
+    def _contains(self, value: str) -> bool:
+        return self.filter is not None and value.encode("utf-8", "surrogatepass") in self.filter
+
+    def is_dictionary_credential(self, username: Optional[str], password: Optional[str]) -> bool:
+        """
+        True if every credential the attempt carries is a dictionary word
+        (root/123456 yes, root/<random> no). Attempts without credentials
+        never count.
+        """
+        if not username and not password:
+            return False
+        return (not username or self.contains(username)) and (not password or self.contains(password))
+
+    def stats(self) -> dict:
+        info = self.contains.cache_info()
+        lookups = info.hits + info.misses
+        bloom = self.filter
+        return {
+            "files": len(self.paths),
+            "entries": self.entries,
+            "bytes": len(bloom.bits) if bloom else 0,
+            "hashes": bloom.k if bloom else 0,
+            "expected_error_rate": round(bloom.error_rate(), 6) if bloom else 0.0,
+            "load_seconds": round(self.seconds, 3),
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+        }
+
+wordlists = WordlistIndex(_wordlist_files(WORDLIST_DIR))
+dictionary_credential = wordlists.is_dictionary_credential